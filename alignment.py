@@ -0,0 +1,112 @@
+# Aligned price matrices for Quantitative Investment Platform
+# Date-indexed price and returns matrices shared by the multi-column analytics
+
+import numpy as np
+import pandas as pd
+
+from caching import LRUCache
+from instrumentation import timed
+
+# How rows are kept when columns have gaps in different places:
+#   inner     dates where every column has a price
+#   outer     dates where any column has a price, gaps forward-filled,
+#             starting once every column has begun
+#   pairwise  dates where any column has a price, gaps left missing
+#             (per-column metrics, pairwise-complete correlations)
+JOINS = ('inner', 'outer', 'pairwise')
+
+DTYPES = ('float64', 'float32')
+
+# (dates, prices, returns) per dataset version, column set and alignment
+matrix_cache = LRUCache(256 * 1024 * 1024, sizeof=lambda m: sum(a.nbytes for a in m if a is not None))
+
+
+def alignment_params(data, default_join='inner', joins=JOINS):
+    """date_column, join and precision from a request body
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    params = {
+        'date_column': data.get('date_column') or None,
+        'join': data.get('join') or default_join,
+        'precision': data.get('precision') or 'float64'
+    }
+    if params['join'] not in joins:
+        raise ValueError(f"join must be one of {', '.join(joins)}")
+    if params['precision'] not in DTYPES:
+        raise ValueError(f"precision must be one of {', '.join(DTYPES)}")
+    return params
+
+
+def _forward_fill(values):
+    valid = ~np.isnan(values)
+    last = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    return values[last, np.arange(values.shape[1])]
+
+
+def align_prices(frame, columns, date_column=None, join='inner'):
+    """(dates, prices) for frame[columns] with rows aligned by `join`
+
+    With date_column, rows are ordered by date, rows whose date does not
+    parse are dropped and the last row wins for a repeated date; dates
+    is then datetime64, otherwise None and rows keep their stored order.
+    prices is a float64 (rows x columns) array.
+    """
+    if join not in JOINS:
+        raise ValueError(f"join must be one of {', '.join(JOINS)}")
+    values = frame[columns].to_numpy(dtype=float)
+    dates = None
+    if date_column:
+        with timed('dates'):
+            parsed = pd.to_datetime(frame[date_column], errors='coerce').to_numpy()
+            rows = np.flatnonzero(~np.isnat(parsed))
+            rows = rows[np.argsort(parsed[rows], kind='stable')]
+            # Stable sort keeps file order within a date, so the last row of a run wins
+            ordered = parsed[rows]
+            last = np.ones(len(rows), dtype=bool)
+            last[:-1] = ordered[1:] != ordered[:-1]
+            rows = rows[last]
+            values, dates = values[rows], parsed[rows]
+
+    with timed('align'):
+        missing = np.isnan(values)
+        keep = ~missing.any(axis=1) if join == 'inner' else ~missing.all(axis=1)
+        values = values[keep]
+        dates = None if dates is None else dates[keep]
+        if join == 'outer':
+            values = _forward_fill(values)
+            complete = ~np.isnan(values).any(axis=1)
+            start = int(np.argmax(complete)) if complete.any() else len(values)
+            values = values[start:]
+            dates = None if dates is None else dates[start:]
+    return dates, values
+
+
+def aligned_matrix(load, columns, date_column=None, join='inner', dtype='float64', cache_key=None):
+    """Aligned (dates, prices, returns) for a column set, built once per cache_key
+
+    load() returns a DataFrame holding columns (and date_column) and is
+    only called on a cache miss. prices is (bars x assets) and returns
+    the (bars - 1 x assets) simple returns, both C-contiguous in dtype
+    and read-only since they are shared. cache_key identifies the
+    dataset version; the column set and alignment options are added.
+    """
+    key = None if cache_key is None else (*cache_key, tuple(columns), date_column, join, dtype)
+    if key is not None:
+        cached = matrix_cache.get(key)
+        if cached is not None:
+            return cached
+
+    dates, prices = align_prices(load(), columns, date_column, join)
+    prices = np.ascontiguousarray(prices, dtype=dtype)
+    with timed('returns'), np.errstate(invalid='ignore', divide='ignore'):
+        returns = prices[1:] / prices[:-1] - 1
+    for array in (dates, prices, returns):
+        if array is not None:
+            array.flags.writeable = False
+
+    matrix = (dates, prices, returns)
+    if key is not None:
+        matrix_cache.put(key, matrix)
+    return matrix
@@ -0,0 +1,408 @@
+# Analytics for Quantitative Investment Platform
+# Pure NumPy computations shared by the web handlers and job workers
+
+import numpy as np
+import pandas as pd
+
+from backtesting import (run_backtest, rebalance_bars, simulate_rebalanced, INITIAL_CAPITAL,
+                         REBALANCE_FREQUENCIES, CURVE_POINTS)
+from instrumentation import timed
+from optimization import normalize_method, portfolio_moments, optimize_weights, efficient_frontier, sharpe_ratios
+
+# Helper functions
+def calculate_returns(prices):
+    """Calculate simple returns"""
+    return np.diff(prices) / prices[:-1]
+
+def calculate_max_drawdown(prices):
+    """Calculate maximum drawdown"""
+    cummax = np.maximum.accumulate(prices)
+    drawdown = (cummax - prices) / cummax
+    return float(np.max(drawdown))
+
+def calculate_moving_average(data, window):
+    """Calculate moving average"""
+    return np.convolve(data, np.ones(window)/window, mode='valid')
+
+# Analyses
+def compute_risk_metrics(prices):
+    """Whole-history risk metrics for one price series"""
+    with timed('returns'):
+        returns = calculate_returns(prices)
+
+    with timed('metrics'):
+        mean_return = float(np.mean(returns) * 252)
+        volatility = float(np.std(returns) * np.sqrt(252))
+        sharpe_ratio = mean_return / volatility if volatility > 0 else 0
+
+        return {
+            'mean': mean_return,
+            'volatility': volatility,
+            'sharpe_ratio': sharpe_ratio,
+            'var_95': float(-np.percentile(returns, 5)),
+            'var_99': float(-np.percentile(returns, 1)),
+            'max_drawdown': calculate_max_drawdown(prices)
+        }
+
+def compute_portfolio(returns, assets, method='equal_weight', risk_free=0.0, cache_key=None, frontier_points=20):
+    """Portfolio allocation and metrics for an aligned (periods x assets) returns matrix
+
+    Build returns with alignment.aligned_matrix so every row is one
+    date. cache_key identifies the dataset version, column set and
+    alignment so the covariance matrix is built once and reused across
+    methods.
+    """
+    method = normalize_method(method)
+    if len(returns) < 2:
+        raise ValueError('Insufficient overlapping data points')
+
+    with timed('moments'):
+        mu, cov = portfolio_moments(np.asarray(returns).T, cache_key)
+
+    result = {'method': method, 'assets': assets}
+    with timed('optimize'):
+        if method == 'efficient_frontier':
+            weights, returns, vols = efficient_frontier(mu, cov, frontier_points)
+            sharpes = sharpe_ratios(weights, mu, cov, risk_free)
+            result['frontier'] = [
+                {
+                    'expected_return': float(r),
+                    'volatility': float(v),
+                    'sharpe_ratio': float(sr),
+                    'weights': w.tolist()
+                }
+                for w, r, v, sr in zip(weights, returns, vols, sharpes)
+            ]
+            # Headline allocation is the best Sharpe ratio on the frontier
+            weights = weights[int(np.argmax(sharpes))]
+        else:
+            weights = optimize_weights(mu, cov, method, risk_free)
+
+    expected_return = float(weights @ mu)
+    portfolio_vol = float(np.sqrt(max(weights @ cov @ weights, 0.0)))
+    sharpe = (expected_return - risk_free) / portfolio_vol if portfolio_vol > 0 else 0
+
+    result.update({
+        'weights': weights.tolist(),
+        'expected_return': expected_return,
+        'volatility': portfolio_vol,
+        'sharpe_ratio': sharpe
+    })
+    return result
+
+def compute_backtest(prices, strategy_type='buyhold', parameter=20, max_points=CURVE_POINTS):
+    """Run a single-asset backtest and summarize the equity curve
+
+    The equity and drawdown curves are min/max downsampled to at most
+    max_points points each.
+    """
+    with timed('backtest'):
+        portfolio_array = run_backtest(prices, strategy_type, parameter)
+    with timed('returns'):
+        returns = calculate_returns(portfolio_array)
+
+    total_return = float((portfolio_array[-1] - INITIAL_CAPITAL) / INITIAL_CAPITAL * 100)
+    volatility = float(np.std(returns) * np.sqrt(252))
+    sharpe = float(np.mean(returns) * 252 / volatility) if volatility > 0 else 0
+
+    with timed('downsample'):
+        drawdown = drawdown_series(portfolio_array)
+        return {
+            'total_return': total_return,
+            'volatility': volatility,
+            'sharpe_ratio': sharpe,
+            'max_drawdown': float(np.max(drawdown)),
+            'equity_curve': downsample_curve(portfolio_array, max_points),
+            'drawdown_curve': downsample_curve(drawdown, max_points),
+            'final_value': float(portfolio_array[-1])
+        }
+
+def compute_portfolio_backtest(prices, assets, method='equal_weight', rebalance='monthly', lookback=252,
+                               cost_bps=0.0, slippage_bps=0.0, weights=None, dates=None,
+                               reestimate=None, risk_free=0.0, max_points=CURVE_POINTS):
+    """Backtest a multi-asset book periodically rebalanced to target weights
+
+    prices is an aligned (bars x assets) matrix. Targets are the given
+    weights, or `method` estimated from the `lookback` bars up to each
+    estimation date, so no future data is used; the book then starts
+    once the first window is available. Estimates are refreshed on the
+    `reestimate` schedule (default: every rebalance, but no more often
+    than monthly since each solve costs O(assets^3)). Curves are
+    downsampled like compute_backtest's, with date labels when dates
+    are given.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n, n_assets = prices.shape
+    if np.any(prices <= 0):
+        raise ValueError('Prices must be positive')
+    method = normalize_method(method)
+    if method == 'efficient_frontier':
+        raise ValueError('efficient_frontier does not define a single allocation')
+
+    estimated = weights is None and method != 'equal_weight'
+    start = lookback if estimated else 0
+    if n - start < 2:
+        raise ValueError('Insufficient data points')
+
+    with timed('optimize'):
+        bars = rebalance_bars(n, rebalance, start, dates)
+        if not estimated:
+            target = np.full(n_assets, 1.0 / n_assets) if weights is None else np.asarray(weights, dtype=float)
+            targets = np.tile(target / target.sum(), (len(bars), 1))
+        else:
+            if reestimate is None:
+                coarse = rebalance == 'never' or REBALANCE_FREQUENCIES[rebalance] >= REBALANCE_FREQUENCIES['monthly']
+                reestimate = rebalance if coarse else 'monthly'
+            estimation_bars = rebalance_bars(n, reestimate, start, dates)
+            # Each rebalance uses the latest estimate; only those are solved
+            latest = np.searchsorted(estimation_bars, bars, side='right') - 1
+            solved = {}
+            for i in np.unique(latest):
+                end = estimation_bars[i]
+                window = prices[end - lookback:end + 1]
+                mu, cov = portfolio_moments((window[1:] / window[:-1] - 1.0).T)
+                solved[i] = optimize_weights(mu, cov, method, risk_free)
+            targets = np.array([solved[i] for i in latest])
+
+    with timed('backtest'):
+        cost_rate = (cost_bps + slippage_bps) / 10_000
+        equity, turnover, costs = simulate_rebalanced(prices, targets, bars, cost_rate)
+    with timed('returns'):
+        returns = calculate_returns(equity)
+
+    years = len(returns) / 252
+    final_value = float(equity[-1])
+    volatility = float(np.std(returns) * np.sqrt(252))
+    mean_return = float(np.mean(returns) * 252)
+    with timed('downsample'):
+        drawdown = drawdown_series(equity)
+        curves = {'equity_curve': downsample_curve(equity, max_points),
+                  'drawdown_curve': downsample_curve(drawdown, max_points)}
+        if dates is not None:
+            # The book starts at bar `start`, so curve positions are offset into dates
+            for curve in curves.values():
+                curve['labels'] = np.datetime_as_string(dates[start + np.array(curve['index'])], unit='D').tolist()
+    return {
+        'method': 'custom' if weights is not None else method,
+        'assets': assets,
+        'rebalance': rebalance,
+        'start_index': int(start),
+        'rebalances': len(bars),
+        'total_return': (final_value - INITIAL_CAPITAL) / INITIAL_CAPITAL * 100,
+        'annual_return': float((final_value / INITIAL_CAPITAL) ** (1 / years) - 1) if final_value > 0 else -1.0,
+        'volatility': volatility,
+        'sharpe_ratio': (mean_return - risk_free) / volatility if volatility > 0 else 0,
+        'max_drawdown': float(np.max(drawdown)),
+        'annual_turnover': float(turnover[1:].sum() / years),
+        'total_costs': float(costs.sum()),
+        'weights': targets[-1].tolist(),
+        **curves,
+        'final_value': final_value
+    }
+
+# Rolling metrics
+def downsample_indices(n, max_points):
+    """Evenly spaced positions (always keeping the last) to bound output size"""
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(np.int64))
+
+# Equity and drawdown curves
+def curve_width(n, max_points):
+    """Bucket width for drawing n points with at most max_points
+
+    1 (every point) when they fit; otherwise the smallest power of two
+    for which each bucket's minimum and maximum plus the two end points
+    fit. Powers of two keep bucket edges fixed as a curve grows, so a
+    longer curve's buckets are merged pairs of a shorter one's.
+    """
+    if n <= max_points:
+        return 1
+    buckets = max((max_points - 2) // 2, 1)
+    width = 2
+    while -(-n // width) > buckets:
+        width *= 2
+    return width
+
+def bucket_extremes(values, width, start=0):
+    """(ids, min positions, minima, max positions, maxima) per bucket
+
+    values sit at positions start, start + 1, ...; bucket k covers
+    positions [k * width, (k + 1) * width). Ties keep the earliest
+    position. One reshape and argmin/argmax over the padded values.
+    """
+    values = np.asarray(values, dtype=float)
+    lead = start % width
+    end = lead + len(values)
+    rows = -(-end // width)
+    lows = np.full(rows * width, np.inf)
+    highs = np.full(rows * width, -np.inf)
+    lows[lead:end] = values
+    highs[lead:end] = values
+    lows, highs = lows.reshape(rows, width), highs.reshape(rows, width)
+    lo, hi = lows.argmin(axis=1), highs.argmax(axis=1)
+    index = np.arange(rows)
+    first = start - lead + index * width
+    return first // width, first + lo, lows[index, lo], first + hi, highs[index, hi]
+
+def merge_buckets(buckets):
+    """Buckets of twice the width, merging neighbouring pairs"""
+    ids, lo_pos, lo_val, hi_pos, hi_val = buckets
+    lead = int(ids[0] % 2)
+    trail = (lead + len(ids)) % 2
+
+    def pairs(values, fill):
+        return np.concatenate(([fill] * lead, values, [fill] * trail)).reshape(-1, 2)
+
+    lows, highs = pairs(lo_val, np.inf), pairs(hi_val, -np.inf)
+    rows = np.arange(len(lows))
+    lo, hi = lows.argmin(axis=1), highs.argmax(axis=1)
+    return (np.arange(ids[0] // 2, ids[-1] // 2 + 1), pairs(lo_pos, 0)[rows, lo], lows[rows, lo],
+            pairs(hi_pos, 0)[rows, hi], highs[rows, hi])
+
+def extend_buckets(buckets, new):
+    """buckets followed by new (same width), combining the bucket they share"""
+    if len(buckets[0]) and buckets[0][-1] == new[0][0]:
+        ids, lo_pos, lo_val, hi_pos, hi_val = (np.array(values) for values in buckets)
+        if new[2][0] < lo_val[-1]:
+            lo_pos[-1], lo_val[-1] = new[1][0], new[2][0]
+        if new[4][0] > hi_val[-1]:
+            hi_pos[-1], hi_val[-1] = new[3][0], new[4][0]
+        buckets = (ids, lo_pos, lo_val, hi_pos, hi_val)
+        new = tuple(values[1:] for values in new)
+    return tuple(np.concatenate((old, added)) for old, added in zip(buckets, new))
+
+def curve_points(buckets, first, last):
+    """{'index', 'values'} of the bucket extremes plus the (position, value) end points"""
+    _, lo_pos, lo_val, hi_pos, hi_val = buckets
+    positions = np.concatenate(([first[0]], lo_pos, hi_pos, [last[0]]))
+    values = np.concatenate(([first[1]], lo_val, hi_val, [last[1]]))
+    index, keep = np.unique(positions, return_index=True)
+    return {'index': index.tolist(), 'values': values[keep].tolist()}
+
+def downsample_curve(values, max_points=CURVE_POINTS):
+    """Min/max bucketed curve for charting, at most max_points points
+
+    Unlike evenly spaced sampling, every peak and trough survives, so a
+    drawn equity or drawdown curve keeps its true range however long
+    the history.
+    """
+    values = np.asarray(values, dtype=float)
+    buckets = bucket_extremes(values, curve_width(len(values), max_points))
+    return curve_points(buckets, (0, values[0]), (len(values) - 1, values[-1]))
+
+def drawdown_series(equity):
+    """Fractional drawdown from the running peak at every point"""
+    peaks = np.maximum.accumulate(equity)
+    return (peaks - equity) / peaks
+
+def compute_rolling_risk(prices, window, var_levels=(0.95, 0.99)):
+    """Trailing-window risk metrics in O(n) per metric
+
+    Mean and volatility come from cumulative sums of returns and squared
+    returns; VaR uses pandas' skiplist rolling quantile (O(n log w)); the
+    drawdown is measured from the rolling peak, tracked with a monotonic
+    deque inside pandas. Values are aligned to price positions
+    window..n-1, the first bar with a full window of returns.
+    """
+    returns = calculate_returns(prices)
+    n = len(returns)
+
+    # Centre before accumulating to keep the sum-of-squares stable
+    shifted = returns - returns.mean()
+    csum = np.concatenate(([0.0], np.cumsum(shifted)))
+    csq = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    window_sum = csum[window:] - csum[:n - window + 1]
+    window_sq = csq[window:] - csq[:n - window + 1]
+    mean = window_sum / window
+    variance = np.maximum(window_sq / window - mean * mean, 0.0)
+
+    mean_return = (mean + returns.mean()) * 252
+    volatility = np.sqrt(variance) * np.sqrt(252)
+    sharpe = np.divide(mean_return, volatility, out=np.zeros_like(volatility), where=volatility > 0)
+
+    rolling = pd.Series(returns).rolling(window)
+    result = {
+        'mean': mean_return,
+        'volatility': volatility,
+        'sharpe_ratio': sharpe
+    }
+    for level in var_levels:
+        quantile = rolling.quantile(1 - level, interpolation='linear').to_numpy()
+        result[f'var_{int(round(level * 100))}'] = -quantile[window - 1:]
+
+    # Peak over the same span of prices the returns window covers
+    peak = pd.Series(prices).rolling(window + 1).max().to_numpy()[window:]
+    result['drawdown'] = (peak - prices[window:]) / peak
+    return result
+
+# Cross-asset metrics
+def compact_columns(matrix):
+    """Move each column's non-NaN values to the top, preserving order
+
+    Equivalent to calling dropna() on every column separately; the
+    ragged tails are padded with NaN. Returns (compacted, counts).
+    """
+    order = np.argsort(np.isnan(matrix), axis=0, kind='stable')
+    compacted = np.take_along_axis(matrix, order, axis=0)
+    return compacted, np.count_nonzero(~np.isnan(matrix), axis=0)
+
+def column_percentiles(values, counts, q):
+    """np.percentile(q) of each column's first `counts` values, in one sort"""
+    ordered = np.sort(values, axis=0)  # NaN padding sorts last
+    position = (np.maximum(counts, 1) - 1) * q / 100.0
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    cols = np.arange(values.shape[1])
+    low_values = ordered[lower, cols]
+    return low_values + (position - lower) * (ordered[upper, cols] - low_values)
+
+def pairwise_correlation(returns):
+    """Correlation over pairwise-complete rows of an (observations x assets) matrix"""
+    valid = (~np.isnan(returns)).astype(float)
+    x = np.where(valid > 0, returns, 0.0)
+    n = valid.T @ valid
+    sums = x.T @ valid            # sums[i, j]: Σ x_i over rows where j is also valid
+    squares = (x * x).T @ valid
+    cross = x.T @ x
+    cov = n * cross - sums * sums.T
+    var_i = n * squares - sums ** 2
+    denom = np.sqrt(np.maximum(var_i * var_i.T, 0.0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.where(denom > 0, cov / denom, np.nan)
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+def compute_batch_risk(price_matrix, min_points=10):
+    """Risk metrics for every column of an (observations x assets) price matrix
+
+    Matches compute_risk_metrics applied to each column's non-missing
+    values, but computed as whole-matrix operations. Columns with fewer
+    than min_points prices get NaN metrics.
+    """
+    prices, counts = compact_columns(np.asarray(price_matrix, dtype=float))
+    returns = prices[1:] / prices[:-1] - 1.0
+    return_counts = np.maximum(counts - 1, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(returns, axis=0)
+        volatility = np.nanstd(returns, axis=0) * np.sqrt(252)
+    mean_return = mean * 252
+    sharpe = np.divide(mean_return, volatility, out=np.zeros_like(mean_return), where=volatility > 0)
+
+    peaks = np.fmax.accumulate(prices, axis=0)
+    with np.errstate(invalid='ignore'):
+        max_drawdown = np.nanmax((peaks - prices) / peaks, axis=0)
+
+    metrics = {
+        'mean': mean_return,
+        'volatility': volatility,
+        'sharpe_ratio': sharpe,
+        'var_95': -column_percentiles(returns, return_counts, 5),
+        'var_99': -column_percentiles(returns, return_counts, 1),
+        'max_drawdown': max_drawdown
+    }
+    insufficient = counts < min_points
+    for values in metrics.values():
+        values[insufficient] = np.nan
+    return metrics
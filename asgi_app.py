@@ -0,0 +1,456 @@
+# ASGI entry point for Quantitative Investment Platform
+# Serves the flask_backend routes to an async server without a thread per open connection
+#
+# Usage:
+#   pip install uvicorn
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+#
+# Every Flask route is served unchanged: the view runs on a thread pool
+# (CPU work already goes on to the job and upload process pools from
+# there), while request bodies are read, response chunks are written,
+# ?wait= long polls are held and event streams are kept open on the
+# event loop, so slow clients and idle connections hold no thread.
+# Generic adapters (asgiref's WsgiToAsgi, a2wsgi) iterate the whole
+# response on one worker thread, which is what this module avoids.
+
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+import flask_backend as backend
+from pipeline import parse_wait
+from serialization import dumps_json
+
+# Threads running Flask views
+EXECUTOR_THREADS = min(32, (os.cpu_count() or 1) + 4)
+# Threads producing streamed response chunks; encoding is CPU-bound, so
+# more threads than cores would only take time from new requests
+STREAM_THREADS = min(8, os.cpu_count() or 1)
+# Request bodies larger than this are spooled to disk while they arrive
+SPOOL_MAX_BYTES = 1024 * 1024
+# Seconds between checks of a watched dataset or job, shared by every
+# connection watching it
+POLL_INTERVAL = 0.25
+# Seconds between comment lines keeping an idle event stream open through proxies
+KEEPALIVE_SECONDS = 15
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix='asgi-view')
+stream_executor = ThreadPoolExecutor(max_workers=STREAM_THREADS, thread_name_prefix='asgi-stream')
+
+JOB_ACTIVE = ('pending', 'running')
+
+# Paths answered on the event loop rather than by a Flask view
+JOB_EVENTS = re.compile(r'^/api/jobs/(?P<key>[^/]+)/events$')
+DATASET_EVENTS = re.compile(r'^/api/datasets/(?P<key>[^/]+)/events$')
+# Paths whose ?wait= is held on the event loop before the view runs
+JOB_RESULT = re.compile(r'^/api/jobs/(?P<key>[^/]+)/result$')
+DATASET_PATH = re.compile(r'^/api/datasets/(?P<key>[^/]+)(?:/(?!status$)[^/].*)?$')
+
+IDLE = object()
+_DONE = object()
+
+
+class Watcher:
+    """One poll loop per watched key, however many connections wait on it
+
+    snapshot(key) returns a JSON-able dict describing the key, or None
+    once it no longer exists; blocking snapshots run on the executor.
+    Subscribers are woken when the snapshot changes.
+    """
+
+    def __init__(self, snapshot, blocking=False, interval=POLL_INTERVAL):
+        self.snapshot = snapshot
+        self.blocking = blocking
+        self.interval = interval
+        self._states = {}
+
+    async def _read(self, key):
+        if not self.blocking:
+            return self.snapshot(key)
+        return await asyncio.get_running_loop().run_in_executor(executor, self.snapshot, key)
+
+    async def _poll(self, key, state):
+        while True:
+            try:
+                value = await self._read(key)
+            except Exception:
+                # Deleted while being read; report it as gone
+                value = None
+            if state['version'] == 0 or value != state['value']:
+                state['value'] = value
+                state['version'] += 1
+                changed, state['changed'] = state['changed'], asyncio.Event()
+                changed.set()
+            if value is None:
+                return
+            await asyncio.sleep(self.interval)
+
+    async def updates(self, key, keepalive=None):
+        """Yield the snapshot now and after every change
+
+        Yields None once the key is gone, and IDLE after keepalive
+        seconds without a change.
+        """
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = {'value': None, 'version': 0, 'subscribers': 0,
+                                         'changed': asyncio.Event(), 'task': None}
+        if state['task'] is None or state['task'].done():
+            state['task'] = asyncio.ensure_future(self._poll(key, state))
+        state['subscribers'] += 1
+        try:
+            seen = 0
+            while True:
+                if state['version'] != seen:
+                    seen = state['version']
+                    yield state['value']
+                    continue
+                try:
+                    await asyncio.wait_for(state['changed'].wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield IDLE
+        finally:
+            state['subscribers'] -= 1
+            if state['subscribers'] == 0:
+                state['task'].cancel()
+                if self._states.get(key) is state:
+                    del self._states[key]
+
+    async def wait(self, key, finished, timeout):
+        """Wait up to timeout seconds until finished(snapshot) or the key is gone"""
+        updates = self.updates(key)
+
+        async def until():
+            async for value in updates:
+                if value is None or finished(value):
+                    return
+
+        try:
+            await asyncio.wait_for(until(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await updates.aclose()
+
+
+def job_snapshot(job_id):
+    job = backend.job_manager.get(job_id)
+    return None if job is None else job.to_dict(include_result=False)
+
+
+def dataset_snapshot(dataset_id):
+    if dataset_id not in backend.datasets:
+        return None
+    ds = backend.refresh_status(dataset_id)
+    progress = backend.columnar_store.status(dataset_id) or {}
+    return {
+        'id': dataset_id,
+        'status': ds.get('status', 'ready'),
+        'stage': progress.get('stage', 'ready'),
+        'progress': progress.get('progress', 1.0),
+        'rows_parsed': progress.get('rows_parsed', ds['row_count']),
+        'error': ds.get('error'),
+        'updated_at': progress.get('updated_at')
+    }
+
+
+jobs = Watcher(job_snapshot)
+uploads = Watcher(dataset_snapshot, blocking=True)
+
+
+# ASGI <-> WSGI
+def wsgi_environ(scope, body, length, query_string):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': query_string.decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive, limit):
+    """The request body as a file, or None if it exceeds limit bytes
+
+    Small bodies stay in memory; larger ones are written to disk on the
+    executor as they arrive.
+    """
+    loop = asyncio.get_running_loop()
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    length = 0
+    more = True
+    while more:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            raise ConnectionResetError('Client disconnected')
+        chunk = message.get('body', b'')
+        length += len(chunk)
+        if limit is not None and length > limit:
+            body.close()
+            return None, length
+        if length > SPOOL_MAX_BYTES:
+            await loop.run_in_executor(executor, body.write, chunk)
+        else:
+            body.write(chunk)
+        more = message.get('more_body', False)
+    body.seek(0)
+    return body, length
+
+
+async def watch_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_json(send, status, payload, headers=()):
+    body = dumps_json(payload)
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        (b'access-control-allow-origin', b'*'),
+        *headers
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def call_flask(scope, receive, send, query_string):
+    """Run the Flask app for one request
+
+    The view runs on the executor; a streamed response is then read one
+    chunk per stream_executor call, waiting on the event loop while the
+    client is slow to take it.
+    """
+    loop = asyncio.get_running_loop()
+    body, length = await read_body(receive, backend.app.config.get('MAX_CONTENT_LENGTH'))
+    if body is None:
+        await send_json(send, 413, {'error': 'Request body too large'})
+        return
+
+    environ = wsgi_environ(scope, body, length, query_string)
+    started = {}
+    written = []
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return write
+
+    def write(data):
+        # Legacy WSGI output goes ahead of the returned iterable, so that response is buffered
+        written.append(data)
+
+    def start():
+        """Run the view: a buffered response comes back whole, a streamed one as its iterable"""
+        iterable = backend.app(environ, start_response)
+        if written or any(name == b'content-length' for name, _ in started['headers']):
+            try:
+                return None, b''.join([*written, *iterable])
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        return iterable, None
+
+    # One context for the whole response so stream_with_context generators
+    # see their request on whichever executor thread resumes them
+    context = contextvars.copy_context()
+    disconnected = None
+    stream = None
+    try:
+        stream, chunk = await loop.run_in_executor(executor, context.run, start)
+        await send({'type': 'http.response.start', 'status': started['status'],
+                    'headers': started['headers']})
+        if stream is None:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': False})
+            return
+        # Chunks have their own pool so long streams never queue ahead of new requests
+        disconnected = asyncio.ensure_future(watch_disconnect(receive))
+        iterator = iter(stream)
+        while not disconnected.done():
+            chunk = await loop.run_in_executor(stream_executor, context.run, next, iterator, _DONE)
+            if chunk is _DONE:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        if disconnected is not None:
+            disconnected.cancel()
+        if stream is not None and hasattr(stream, 'close'):
+            await loop.run_in_executor(stream_executor, context.run, stream.close)
+        body.close()
+
+
+# Server-sent events
+def sse(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + dumps_json(data) + b'\n\n'
+
+
+async def event_stream(receive, send, updates, finished, final=None):
+    """Stream snapshots as `status` events until finished(snapshot), then a `done` event
+
+    final(snapshot) returns the payload of the done event (the snapshot
+    itself by default).
+    """
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+        (b'access-control-allow-origin', b'*')
+    ]})
+    disconnected = asyncio.ensure_future(watch_disconnect(receive))
+    try:
+        async for value in updates:
+            if disconnected.done():
+                return
+            if value is IDLE:
+                chunk = b': keepalive\n\n'
+            elif value is None:
+                chunk = sse('error', {'error': 'Not found'})
+            elif finished(value):
+                chunk = sse('done', final(value) if final else value)
+            else:
+                chunk = sse('status', value)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if value is not IDLE and (value is None or finished(value)):
+                break
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+        await updates.aclose()
+
+
+async def job_events(job_id, receive, send):
+    """GET /api/jobs/<id>/events: status changes, then the finished job with its result"""
+    if backend.job_manager.get(job_id) is None:
+        await send_json(send, 404, {'error': 'Job not found'})
+        return
+
+    def final(snapshot):
+        job = backend.job_manager.get(snapshot['id'])
+        return snapshot if job is None else job.to_dict()
+
+    await event_stream(receive, send, jobs.updates(job_id, KEEPALIVE_SECONDS),
+                       lambda s: s['status'] not in JOB_ACTIVE, final)
+
+
+async def dataset_events(dataset_id, receive, send):
+    """GET /api/datasets/<id>/events: upload stage and progress until ready or failed"""
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(executor, backend.datasets.__contains__, dataset_id):
+        await send_json(send, 404, {'error': 'Dataset not found'})
+        return
+    await event_stream(receive, send, uploads.updates(dataset_id, KEEPALIVE_SECONDS),
+                       lambda s: s['status'] != 'processing')
+
+
+async def hold_wait(scope, query_string):
+    """Serve ?wait= on the event loop, returning the query string to pass on
+
+    Dataset routes wait for the upload to finish, job results for the
+    job; wait is then dropped so the view answers at once. An invalid
+    wait is passed through for the view to reject.
+    """
+    params = parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)
+    value = dict(params).get('wait')
+    if value is None or scope['method'] == 'OPTIONS':
+        return query_string
+    try:
+        seconds = parse_wait(value, backend.app.config['READY_WAIT_MAX'])
+    except ValueError:
+        return query_string
+
+    job = JOB_RESULT.match(scope['path'])
+    dataset = DATASET_PATH.match(scope['path'])
+    if job and scope['method'] == 'GET':
+        await jobs.wait(job['key'], lambda s: s['status'] not in JOB_ACTIVE, seconds)
+    elif dataset and not DATASET_EVENTS.match(scope['path']):
+        await uploads.wait(dataset['key'], lambda s: s['status'] != 'processing', seconds)
+    else:
+        return query_string
+    return urlencode([(k, v) for k, v in params if k != 'wait']).encode('latin-1')
+
+
+def shutdown():
+    backend.job_manager.shutdown()
+    backend.upload_pipeline.shutdown()
+    executor.shutdown(wait=False, cancel_futures=True)
+    stream_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def lifespan(receive, send):
+    """Nothing to start (flask_backend is ready once imported); shutdown stops the pools"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, shutdown)
+            except Exception as e:
+                await send({'type': 'lifespan.shutdown.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def reject_websocket(receive, send):
+    """There are no websocket routes: close during the handshake (the server answers 403)"""
+    if (await receive())['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': 1008})
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'websocket':
+        await reject_websocket(receive, send)
+        return
+    if scope['type'] != 'http':
+        # The ASGI spec asks applications to raise on scope types they do not know
+        raise RuntimeError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    path = scope['path']
+    if scope['method'] == 'GET':
+        match = JOB_EVENTS.match(path)
+        if match:
+            await job_events(match['key'], receive, send)
+            return
+        match = DATASET_EVENTS.match(path)
+        if match:
+            await dataset_events(match['key'], receive, send)
+            return
+
+    query_string = await hold_wait(scope, scope.get('query_string', b''))
+    try:
+        await call_flask(scope, receive, send, query_string)
+    except ConnectionResetError:
+        pass
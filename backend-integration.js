@@ -108,6 +108,29 @@ class BackendService {
         });
     }
 
+    async waitForDataset(datasetId, onProgress = null) {
+        // Uploads are parsed in the background; poll until the dataset is ready
+        while (true) {
+            const status = await this.fetchWithTimeout(`${this.baseUrl}/api/datasets/${datasetId}/status`);
+
+            if (status.status === 'ready') {
+                return status;
+            }
+            if (status.status === 'failed') {
+                throw new Error(`Upload processing failed: ${status.error}`);
+            }
+            if (onProgress) {
+                onProgress(status.stage, status.progress);
+            }
+
+            await new Promise(resolve => setTimeout(resolve, 500));
+        }
+    }
+
+    async getPreview(datasetId, limit = 50) {
+        return await this.fetchWithTimeout(`${this.baseUrl}/api/datasets/${datasetId}?limit=${limit}`);
+    }
+
     async calculateRiskMetrics(column) {
         if (!this.currentDatasetId) {
             throw new Error('No dataset uploaded');
@@ -198,10 +221,15 @@ class HybridDataService extends DataService {
         try {
             this.emit('data:loading', { filename: file.name, mode: 'backend' });
 
-            const result = await this.backend.uploadFile(file, (percent) => {
+            const upload = await this.backend.uploadFile(file, (percent) => {
                 this.emit('data:progress', { percent: Math.round(percent) });
             });
 
+            await this.backend.waitForDataset(upload.id, (stage, progress) => {
+                this.emit('data:processing', { stage, progress });
+            });
+            const result = await this.backend.getPreview(upload.id);
+
             const dataset = {
                 headers: result.headers,
                 rows: result.rows,
@@ -264,7 +292,7 @@ class HybridDataService extends DataService {
                 
                 // Transform backend response to match frontend format
                 return {
-                    portfolioValues: result.portfolio_values || [],
+                    portfolioValues: result.equity_curve ? result.equity_curve.values : [],
                     returns: [],
                     metrics: {
                         mean: result.total_return / 100,
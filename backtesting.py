@@ -0,0 +1,304 @@
+# Backtesting engine for Quantitative Investment Platform
+# Vectorized NumPy replacement for the per-bar simulation loop
+
+import numpy as np
+
+from alignment import alignment_params
+
+STRATEGIES = ('buyhold', 'sma', 'momentum')
+INITIAL_CAPITAL = 10000.0
+
+# Most points returned for each equity or drawdown curve
+CURVE_POINTS = 500
+
+
+def sma_references(prices, windows, csum=None):
+    """Mean of the previous w prices at every bar, one row per window w
+
+    Bars with fewer than w earlier prices are NaN. Every row is a
+    difference of the same cumulative sum (pass csum, with a leading 0,
+    to share it), so a window's row is identical however many windows
+    are computed with it and /backtest and the sweep agree bar for bar.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if csum is None:
+        csum = np.concatenate(([0.0], np.cumsum(prices)))
+    bars = np.arange(len(prices))
+    w = np.asarray(windows, dtype=np.int64)[:, None]
+    lagged = bars - w
+    sums = csum[bars] - csum[np.clip(lagged, 0, None)]
+    return np.where(lagged >= 0, sums / w, np.nan)
+
+
+def generate_signals(prices, strategy_type, parameter):
+    """Return a 0/1 long/flat signal per bar
+
+    sma: long when the price is above the mean of the previous
+    `parameter` prices. momentum: long when the price is above the
+    price `parameter` bars ago. Unknown strategies stay flat.
+    """
+    prices = np.asarray(prices, dtype=float)
+    n = len(prices)
+    signals = np.zeros(n)
+
+    if strategy_type == 'buyhold':
+        signals[:] = 1.0
+    elif strategy_type in ('sma', 'momentum') and parameter < n:
+        if strategy_type == 'sma':
+            reference = sma_references(prices, [parameter])[0, parameter:]
+        else:
+            reference = prices[:n - parameter]
+        signals[parameter:] = prices[parameter:] > reference
+
+    return signals
+
+
+def simulate_equity(prices, signals, initial_capital=INITIAL_CAPITAL):
+    """Equity curve for an all-in/all-out strategy driven by signals
+
+    A position is opened on the bar where the signal turns 1 and closed
+    on the bar where it turns 0, so the book is long over bar t exactly
+    when signals[t - 1] == 1. Equity is the cumulative product of the
+    price relatives over those bars.
+    """
+    prices = np.asarray(prices, dtype=float)
+    held = np.asarray(signals)[:-1] == 1
+    growth = np.ones(len(prices))
+    growth[1:] = np.where(held, prices[1:] / prices[:-1], 1.0)
+    return initial_capital * np.cumprod(growth)
+
+
+def position_changes(signals):
+    """Trades implied by a signal series: +1 buy, -1 sell, 0 hold"""
+    return np.diff(np.asarray(signals), prepend=0.0)
+
+
+def run_backtest(prices, strategy_type='buyhold', parameter=20, initial_capital=INITIAL_CAPITAL):
+    """Generate signals and simulate the resulting equity curve"""
+    signals = generate_signals(prices, strategy_type, parameter)
+    return simulate_equity(prices, signals, initial_capital)
+
+
+def parse_backtest_params(data):
+    """Validated single-strategy backtest settings from a request body
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    if not data.get('price_column'):
+        raise ValueError('price_column required')
+    try:
+        params = {
+            'price_column': data['price_column'],
+            'strategy_type': data.get('strategy_type', 'buyhold'),
+            'parameter': int(data.get('parameter', 20)),
+            'max_points': int(data.get('max_points', CURVE_POINTS))
+        }
+    except (TypeError, ValueError):
+        raise ValueError('parameter and max_points must be integers')
+    if params['parameter'] < 1:
+        raise ValueError('parameter must be positive')
+    if params['max_points'] < 4:
+        raise ValueError('max_points must be at least 4')
+    return params
+
+
+# Parameter sweeps
+SWEEP_METRICS = ('total_return', 'volatility', 'sharpe_ratio', 'max_drawdown', 'final_value')
+
+
+def sweep_backtests(prices, strategy_type, windows, initial_capital=INITIAL_CAPITAL, max_cells=4_000_000):
+    """Backtest one strategy for many windows at once
+
+    The signal and equity grids are evaluated as (windows x bars) arrays
+    in blocks of at most `max_cells` elements to keep memory bounded.
+    SMA references for every window are gathered from one cumulative
+    sum, the same one generate_signals uses, so every row reproduces
+    run_backtest exactly. Returns a dict of metric arrays aligned with
+    `windows`.
+    """
+    prices = np.asarray(prices, dtype=float)
+    windows = np.asarray(windows, dtype=np.int64)
+    n = len(prices)
+    relatives = prices[1:] / prices[:-1]
+    bars = np.arange(n)
+    csum = np.concatenate(([0.0], np.cumsum(prices)))
+
+    results = {name: np.empty(len(windows)) for name in SWEEP_METRICS}
+    block = max(1, max_cells // max(n, 1))
+
+    for start in range(0, len(windows), block):
+        w = windows[start:start + block, None]
+        lagged = np.clip(bars - w, 0, None)
+
+        if strategy_type == 'buyhold':
+            signals = np.ones((len(w), n), dtype=bool)
+        elif strategy_type == 'sma':
+            # NaN references (too few earlier bars) compare False: flat
+            signals = prices > sma_references(prices, w[:, 0], csum)
+        elif strategy_type == 'momentum':
+            signals = (prices > prices[lagged]) & (bars >= w)
+        else:
+            signals = np.zeros((len(w), n), dtype=bool)
+
+        growth = np.where(signals[:, :-1], relatives, 1.0)
+        equity = initial_capital * np.cumprod(growth, axis=1)
+        equity = np.concatenate((np.full((len(w), 1), initial_capital), equity), axis=1)
+
+        returns = growth - 1.0
+        volatility = returns.std(axis=1) * np.sqrt(252)
+        mean = returns.mean(axis=1) * 252
+        sharpe = np.divide(mean, volatility, out=np.zeros_like(mean), where=volatility > 0)
+        cummax = np.maximum.accumulate(equity, axis=1)
+        drawdown = ((cummax - equity) / cummax).max(axis=1)
+
+        rows = slice(start, start + len(w))
+        results['total_return'][rows] = (equity[:, -1] - initial_capital) / initial_capital * 100
+        results['volatility'][rows] = volatility
+        results['sharpe_ratio'][rows] = sharpe
+        results['max_drawdown'][rows] = drawdown
+        results['final_value'][rows] = equity[:, -1]
+
+    return results
+
+
+def parse_parameter_grid(spec, max_windows=None):
+    """Expand a list of windows or a {start, stop, step} range (stop inclusive)
+
+    The grid size is checked against max_windows before anything is
+    expanded, so an oversized range is rejected without building it.
+    """
+    if isinstance(spec, dict):
+        start = int(spec.get('start', 5))
+        stop = int(spec.get('stop', 200))
+        step = int(spec.get('step', 5))
+        if step < 1:
+            raise ValueError('step must be positive')
+        grid = range(start, stop + 1, step)
+    else:
+        grid = spec
+    if max_windows is not None and len(grid) > max_windows:
+        raise ValueError('Too many parameter combinations')
+    windows = [int(w) for w in grid]
+    if not windows or min(windows) < 1:
+        raise ValueError('parameters must be positive integers')
+    return sorted(set(windows))
+
+
+# Multi-asset portfolios
+REBALANCE_FREQUENCIES = {'daily': 1, 'weekly': 5, 'monthly': 21, 'quarterly': 63, 'yearly': 252}
+
+
+def _period_keys(dates, frequency):
+    """Calendar period of each date (weeks start on Monday)"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    if frequency == 'daily':
+        return days.astype(np.int64)
+    if frequency == 'weekly':
+        # 1970-01-01 was a Thursday
+        return (days.astype(np.int64) + 3) // 7
+    months = days.astype('datetime64[M]').astype(np.int64)
+    if frequency == 'monthly':
+        return months
+    if frequency == 'quarterly':
+        return months // 3
+    return months // 12
+
+
+def rebalance_bars(n, frequency, start=0, dates=None):
+    """Bars from `start` on which the book is reset to its target weights
+
+    The first is `start`; then the first bar of every calendar period
+    when dates are given, or every REBALANCE_FREQUENCIES[frequency]
+    bars otherwise. 'never' holds the initial allocation throughout.
+    """
+    if frequency == 'never':
+        return np.array([start])
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f'Unknown rebalance frequency {frequency}')
+    if dates is None:
+        return np.arange(start, n, REBALANCE_FREQUENCIES[frequency])
+    keys = _period_keys(dates, frequency)
+    changes = np.flatnonzero(keys[start + 1:] != keys[start:-1]) + start + 1
+    return np.concatenate(([start], changes))
+
+
+def simulate_rebalanced(prices, targets, bars, cost_rate=0.0, initial_capital=INITIAL_CAPITAL):
+    """Equity curve of a book reset to target weights on rebalance bars
+
+    prices is an aligned (bars x assets) matrix and targets holds one
+    row of weights (summing to 1) per rebalance bar. Between rebalances
+    the holdings drift with prices, so value relative to the last
+    rebalance b is prices[t] @ (w / prices[b]): one row-wise dot product
+    per bar over the whole matrix, no per-bar Python loop. Each
+    rebalance pays cost_rate times turnover (sum of |target - drifted
+    weight|), the first one buying the book from cash.
+
+    Returns the equity from bars[0] on, the turnover of each rebalance
+    and the cost paid at each, in currency.
+    """
+    prices = np.asarray(prices, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    bars = np.asarray(bars)
+    start = bars[0]
+
+    units = targets / prices[bars]
+    segment = np.searchsorted(bars, np.arange(start, len(prices)), side='right') - 1
+    relative = np.einsum('ti,ti->t', prices[start:], units[segment])
+
+    # Holdings of each segment valued at the next rebalance, before trading
+    drifted = units[:-1] * prices[bars[1:]]
+    growth = drifted.sum(axis=1)
+    turnover = np.concatenate((
+        [np.abs(targets[0]).sum()],
+        np.abs(targets[1:] - drifted / growth[:, None]).sum(axis=1)
+    ))
+    kept = 1.0 - cost_rate * turnover
+
+    # Value at each rebalance after paying for it
+    value = initial_capital * np.cumprod(np.concatenate(([kept[0]], growth * kept[1:])))
+    before = np.concatenate(([initial_capital], value[:-1] * growth))
+    return value[segment] * relative, turnover, before * cost_rate * turnover
+
+
+def parse_portfolio_params(data):
+    """Validated portfolio backtest settings from a request body
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        params = {
+            'columns': list(data.get('columns') or []),
+            'method': data.get('method', 'equal_weight'),
+            'rebalance': data.get('rebalance', 'monthly'),
+            'reestimate': data.get('reestimate'),
+            'lookback': int(data.get('lookback', 252)),
+            'cost_bps': float(data.get('cost_bps', 0.0)),
+            'slippage_bps': float(data.get('slippage_bps', 0.0)),
+            'risk_free_rate': float(data.get('risk_free_rate', 0.0)),
+            'max_points': int(data.get('max_points', CURVE_POINTS))
+        }
+        weights = data.get('weights')
+        params['weights'] = None if weights is None else [float(w) for w in weights]
+    except (TypeError, ValueError):
+        raise ValueError('lookback, cost_bps, slippage_bps, risk_free_rate, max_points and weights must be numeric')
+    if len(params['columns']) < 2:
+        raise ValueError('At least 2 columns required')
+    # Every bar needs a price for every asset, so gaps cannot stay missing
+    alignment = alignment_params(data, joins=('inner', 'outer'))
+    params['date_column'] = alignment['date_column']
+    params['join'] = alignment['join']
+    for name in ('rebalance', 'reestimate'):
+        if params[name] is not None and params[name] != 'never' and params[name] not in REBALANCE_FREQUENCIES:
+            raise ValueError(f"{name} must be never or one of {', '.join(REBALANCE_FREQUENCIES)}")
+    if params['lookback'] < 2:
+        raise ValueError('lookback must be at least 2')
+    if params['max_points'] < 4:
+        raise ValueError('max_points must be at least 4')
+    if params['cost_bps'] < 0 or params['slippage_bps'] < 0:
+        raise ValueError('cost_bps and slippage_bps must be non-negative')
+    if params['weights'] is not None:
+        if len(params['weights']) != len(params['columns']):
+            raise ValueError(f"Expected {len(params['columns'])} weights")
+        if sum(params['weights']) <= 0:
+            raise ValueError('weights must have a positive sum')
+    return params
@@ -0,0 +1,238 @@
+# Benchmarks for Quantitative Investment Platform
+# Times analytics helpers and Flask endpoints over synthetic price panels
+#
+# Usage:
+#   python benchmark.py --output base.json
+#   python benchmark.py --rows 1000 100000 --columns 1 10 --output new.json --compare base.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from analytics import (calculate_returns, calculate_max_drawdown, calculate_moving_average,
+                       compute_risk_metrics, compute_backtest, compute_portfolio,
+                       compute_rolling_risk, compute_batch_risk, compute_portfolio_backtest)
+from alignment import aligned_matrix, matrix_cache
+from optimization import moments_cache
+
+DEFAULT_ROWS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_COLUMNS = [1, 10, 100, 1000]
+
+
+def synthetic_panel(rows, columns, seed=0):
+    """Geometric random-walk prices, shape (rows, columns)"""
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(0.0003, 0.01, size=(rows, columns))
+    return 100.0 * np.exp(np.cumsum(log_returns, axis=0))
+
+
+def measure(fn, repeat):
+    """Wall-clock times over `repeat` runs, then peak traced allocation of one more run
+
+    Peak memory is measured separately because tracemalloc slows the
+    code it traces.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds_min': min(times),
+        'seconds_median': statistics.median(times),
+        'repeat': repeat,
+        'peak_bytes': peak
+    }
+
+
+# Analytics helpers: (name, minimum columns, minimum rows, fn(panel))
+HELPERS = [
+    ('calculate_returns', 1, 2, lambda p: calculate_returns(p[:, 0])),
+    ('calculate_max_drawdown', 1, 1, lambda p: calculate_max_drawdown(p[:, 0])),
+    ('calculate_moving_average', 1, 20, lambda p: calculate_moving_average(p[:, 0], 20)),
+    ('compute_risk_metrics', 1, 10, lambda p: compute_risk_metrics(p[:, 0])),
+    ('compute_backtest_sma', 1, 50, lambda p: compute_backtest(p[:, 0], 'sma', 20)),
+    ('compute_rolling_risk', 1, 65, lambda p: compute_rolling_risk(p[:, 0], 63)),
+    ('compute_batch_risk', 2, 10, lambda p: compute_batch_risk(p)),
+    ('compute_portfolio_max_sharpe', 2, 10,
+     lambda p: compute_portfolio(p[1:] / p[:-1] - 1, [f'c{i}' for i in range(p.shape[1])], 'max_sharpe')),
+    ('aligned_matrix_outer', 2, 2,
+     lambda p: aligned_matrix(lambda: pd.DataFrame(p), list(range(p.shape[1])), join='outer')),
+    ('compute_portfolio_backtest', 2, 10,
+     lambda p: compute_portfolio_backtest(p, [f'c{i}' for i in range(p.shape[1])], rebalance='monthly', cost_bps=5)),
+]
+
+
+def bench_helpers(panel, repeat):
+    rows, columns = panel.shape
+    for name, min_columns, min_rows, fn in HELPERS:
+        if columns < min_columns or rows < min_rows:
+            continue
+        yield {'kind': 'helper', 'name': name, **measure(lambda: fn(panel), repeat)}
+
+
+# Endpoints: (name, minimum columns, method, path under the dataset, body(column names))
+ENDPOINTS = [
+    ('get_dataset_page', 1, 'get', '?offset=0&limit=1000', None),
+    ('risk_metrics', 1, 'post', '/risk-metrics', lambda cols: {'column': cols[0]}),
+    ('backtest', 1, 'post', '/backtest',
+     lambda cols: {'price_column': cols[0], 'strategy_type': 'sma', 'parameter': 20}),
+    ('rolling_risk', 1, 'post', '/rolling-risk', lambda cols: {'column': cols[0], 'window': 63}),
+    ('monte_carlo_var', 1, 'post', '/monte-carlo-var',
+     lambda cols: {'columns': cols, 'paths': 100_000, 'seed': 1}),
+    ('risk_metrics_batch', 2, 'post', '/risk-metrics/batch', lambda cols: {'columns': cols}),
+    ('optimize_portfolio', 2, 'post', '/optimize-portfolio',
+     lambda cols: {'columns': cols, 'method': 'max_sharpe'}),
+    ('backtest_portfolio', 2, 'post', '/backtest/portfolio',
+     lambda cols: {'columns': cols, 'rebalance': 'monthly', 'cost_bps': 5}),
+]
+
+
+def bench_endpoints(panel, repeat):
+    """Upload the panel as CSV, then time each endpoint cold and warm
+
+    Cold runs clear the response, column, matrix and moments caches first;
+    warm runs clear only the response cache.
+    """
+    import flask_backend
+
+    client = flask_backend.app.test_client()
+    warm = [flask_backend.result_cache]
+    cold = warm + [flask_backend.column_cache, matrix_cache, moments_cache]
+    rows, columns = panel.shape
+    names = [f'c{i}' for i in range(columns)]
+    body = pd.DataFrame(panel, columns=names).to_csv(index=False).encode()
+    dataset_ids = []
+
+    def upload():
+        response = client.post('/api/upload/stream?name=bench.csv', data=body, content_type='text/csv')
+        assert response.status_code == 200, response.get_json()
+        dataset_ids.append(response.get_json()['id'])
+
+    try:
+        yield {'kind': 'endpoint', 'name': 'upload_stream', **measure(upload, repeat)}
+        base = f'/api/datasets/{dataset_ids[-1]}'
+
+        for name, min_columns, method, path, make_body in ENDPOINTS:
+            if columns < min_columns or rows < 100:
+                continue
+            payload = make_body(names) if make_body else None
+
+            def call(caches):
+                for cache in caches:
+                    cache.clear()
+                response = getattr(client, method)(base + path, json=payload)
+                assert response.status_code == 200, response.get_json()
+
+            # Cold: every cache dropped, so columns are read and matrices rebuilt.
+            # Warm: only the response is recomputed, from cached columns and matrices.
+            yield {'kind': 'endpoint', 'name': name, **measure(lambda: call(cold), repeat)}
+            yield {'kind': 'endpoint', 'name': f'{name}:warm', **measure(lambda: call(warm), repeat)}
+    finally:
+        for dataset_id in dataset_ids:
+            client.delete(f'/api/datasets/{dataset_id}')
+
+
+def environment():
+    """Where the numbers came from, so result files can be compared fairly"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def run(rows_grid, columns_grid, repeat, max_cells, endpoint_max_cells, endpoints=True):
+    results = []
+    for rows in rows_grid:
+        for columns in columns_grid:
+            if rows * columns > max_cells:
+                continue
+            panel = synthetic_panel(rows, columns)
+            benches = [bench_helpers(panel, repeat)]
+            if endpoints and rows * columns <= endpoint_max_cells:
+                benches.append(bench_endpoints(panel, repeat))
+            for bench in benches:
+                for result in bench:
+                    result.update(rows=rows, columns=columns)
+                    results.append(result)
+                    print(f"{result['kind']:8} {result['name']:30} {rows:>10} x {columns:<5} "
+                          f"{result['seconds_min'] * 1000:10.2f} ms {result['peak_bytes'] / 2**20:9.1f} MiB",
+                          file=sys.stderr)
+    return results
+
+
+def compare(results, baseline):
+    """Print time and peak-memory ratios (new / baseline) for matching cases"""
+    key = lambda r: (r['kind'], r['name'], r['rows'], r['columns'])
+    previous = {key(r): r for r in baseline['results']}
+    print(f"{'case':58} {'time':>8} {'memory':>8}", file=sys.stderr)
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        time_ratio = result['seconds_min'] / old['seconds_min'] if old['seconds_min'] else float('nan')
+        memory_ratio = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else float('nan')
+        case = f"{result['name']} {result['rows']}x{result['columns']}"
+        print(f"{case:58} {time_ratio:7.2f}x {memory_ratio:7.2f}x", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark analytics helpers and endpoints')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--columns', type=int, nargs='+', default=DEFAULT_COLUMNS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-cells', type=int, default=10_000_000,
+                        help='skip panels with more rows x columns than this')
+    parser.add_argument('--endpoint-max-cells', type=int, default=1_000_000,
+                        help='only upload panels up to this size for endpoint timings')
+    parser.add_argument('--no-endpoints', action='store_true', help='time the helpers only')
+    parser.add_argument('--output', help='write JSON results here (default stdout)')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.columns, args.repeat, args.max_cells,
+                  args.endpoint_max_cells, endpoints=not args.no_endpoints)
+    report = {'environment': environment(), 'results': results}
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# Caching utilities for Quantitative Investment Platform
+# Shared by flask_backend.py and django_backend.py
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by a total size budget"""
+
+    def __init__(self, max_bytes, sizeof=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 1)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return a cached value and mark it as most recently used"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries over budget"""
+        size = int(self.sizeof(value))
+        with self._lock:
+            self._remove(key)
+            # Entries larger than the whole budget are never cached
+            if size > self.max_bytes:
+                return False
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def pop(self, key):
+        """Remove a single entry"""
+        with self._lock:
+            return self._remove(key)
+
+    def discard(self, predicate):
+        """Remove every entry whose key matches predicate"""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def items(self, predicate=None):
+        """Snapshot of (key, value) pairs, optionally filtered by key"""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()
+                    if predicate is None or predicate(key)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.current_bytes -= entry[1]
+        return entry[0]
+
+
+def dataframe_nbytes(df):
+    """Deep memory footprint of a DataFrame in bytes"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def series_nbytes(series):
+    """Deep memory footprint of a Series (values and index) in bytes"""
+    return int(series.memory_usage(deep=True))
+
+
+class DataFrameCache(LRUCache):
+    """Parsed DataFrames keyed by dataset id and source file mtime"""
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes, sizeof=dataframe_nbytes)
+
+    def load(self, dataset_id, path, reader):
+        """Return the parsed file at path, calling reader(path) on a miss"""
+        mtime = os.path.getmtime(path)
+        key = (dataset_id, mtime)
+        df = self.get(key)
+        if df is None:
+            df = reader(path)
+            # A newer file replaces whatever was cached for this dataset
+            self.invalidate(dataset_id)
+            self.put(key, df)
+        return df
+
+    def invalidate(self, dataset_id):
+        """Drop every cached version of a dataset"""
+        return self.discard(lambda key: key[0] == dataset_id)
+
+
+def canonical_params(params):
+    """Stable JSON encoding of request parameters (key order independent)"""
+    return json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def params_hash(version, endpoint, params):
+    """Content address of an analysis: dataset version, endpoint and parameters"""
+    payload = f'{version}|{endpoint}|{canonical_params(params)}'
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value covers the given (unquoted) ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or any(
+        tag.removeprefix('W/').strip('"') == etag for tag in candidates
+    )
@@ -1,5 +1,8 @@
 # Django Backend for Quantitative Investment Platform
 # Install: pip install django djangorestframework pandas numpy django-cors-headers
+# Optional: pip install pyarrow (Arrow IPC dataset responses)
+# Optional: pip install orjson msgpack (faster JSON, MessagePack responses)
+# Optional: pip install scipy (Cholesky solves in the portfolio optimizer)
 
 # settings.py additions
 """
@@ -16,6 +19,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -36,7 +40,35 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.MultiPartParser',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
+
+# ?profile=1 returns a cProfile summary instead of the response body
+ALLOW_PROFILING = DEBUG
+
+# Memory budget for parsed datasets shared by all requests in a process
+DATAFRAME_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Typed per-column copies of each upload, memory-mapped by the analyses
+COLUMNAR_STORE_ROOT = MEDIA_ROOT / 'columnar'
+
+# Upper bound on Monte Carlo paths per request
+MAX_SIMULATION_PATHS = 5_000_000
+
+# Upper bound on strategy x window combinations per backtest sweep
+MAX_SWEEP_COMBINATIONS = 5000
+
+# Processes parsing uploads in the background, rows parsed per chunk, and
+# how long an analysis may wait (?wait= seconds) for an upload to finish
+UPLOAD_WORKERS = 2
+INGEST_CHUNK_ROWS = 100_000
+READY_WAIT_MAX = 30
 """
 
 # models.py
@@ -45,13 +77,24 @@ from django.contrib.auth.models import User
 import json
 
 class Dataset(models.Model):
+    STATUSES = [
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     file = models.FileField(upload_to='datasets/')
-    headers = models.JSONField()
-    row_count = models.IntegerField()
-    column_count = models.IntegerField()
+    # Filled in by the upload pipeline once the file is parsed
+    headers = models.JSONField(default=list)
+    row_count = models.IntegerField(default=0)
+    column_count = models.IntegerField(default=0)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the data changes; part of every analysis cache key
+    version = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUSES, default='ready')
+    error = models.TextField(blank=True, default='')
     
     class Meta:
         ordering = ['-uploaded_at']
@@ -67,10 +110,83 @@ class Analysis(models.Model):
     analysis_type = models.CharField(max_length=20, choices=ANALYSIS_TYPES)
     parameters = models.JSONField()
     results = models.JSONField()
+    # sha256 of dataset version, analysis type and canonical parameters
+    params_hash = models.CharField(max_length=64, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['dataset', 'analysis_type', 'params_hash']),
+            # History listings: one dataset (and type), newest first; id breaks ties
+            models.Index(fields=['dataset', 'analysis_type', '-created_at', '-id']),
+            models.Index(fields=['dataset', '-created_at', '-id']),
+        ]
+
+# migrations/0002_dataset_status_analysis_params_hash.py
+# Upload status, dataset versions and analysis lookup indexes; 0001_initial
+# is what makemigrations generates for the original two models
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='analysis',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='params_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='dataset',
+            name='column_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='dataset',
+            name='headers',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AlterField(
+            model_name='dataset',
+            name='row_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['dataset', 'analysis_type', 'params_hash'], name='api_analysi_dataset_9b0069_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['dataset', 'analysis_type', '-created_at', '-id'], name='api_analysi_dataset_a97b37_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['dataset', '-created_at', '-id'], name='api_analysi_dataset_af73f3_idx'),
+        ),
+    ]
 
 # serializers.py
 from rest_framework import serializers
@@ -78,21 +194,147 @@ from rest_framework import serializers
 class DatasetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Dataset
-        fields = ['id', 'name', 'headers', 'row_count', 'column_count', 'uploaded_at']
+        fields = ['id', 'name', 'headers', 'row_count', 'column_count', 'uploaded_at', 'status']
 
 class AnalysisSerializer(serializers.ModelSerializer):
     class Meta:
         model = Analysis
         fields = ['id', 'dataset', 'analysis_type', 'parameters', 'results', 'created_at']
 
+class AnalysisSummarySerializer(serializers.ModelSerializer):
+    """History rows without results, which can be large; fetch one analysis for them"""
+    class Meta:
+        model = Analysis
+        fields = ['id', 'dataset', 'analysis_type', 'parameters', 'created_at']
+
 # views.py
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 import pandas as pd
 import numpy as np
 import io
+import os
+from caching import DataFrameCache, params_hash, etag_matches
+from storage import ColumnarStore
+from analytics import (compute_portfolio, compute_rolling_risk, downsample_indices,
+                       compute_batch_risk, pairwise_correlation, compute_portfolio_backtest)
+from alignment import aligned_matrix, alignment_params, matrix_cache
+from backtesting import sweep_backtests, parse_parameter_grid, parse_portfolio_params, STRATEGIES
+from optimization import normalize_method
+from simulation import simulate_var, parse_simulation_params
+from instrumentation import timed, render_metrics, PROMETHEUS_MIMETYPE
+from jobs import JobManager
+from pipeline import queue_upload, submit_upload, parse_wait, wait_until, FINAL_STAGES
+from profiling import load_profile
+from serialization import (parse_row_window, parse_limit, iter_ndjson, iter_arrow_ipc,
+                           nan_to_none, NDJSON_MIMETYPE, ARROW_MIMETYPE, pa)
+
+# Process-wide cache of parsed dataset files
+dataframe_cache = DataFrameCache(
+    getattr(settings, 'DATAFRAME_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+)
+
+columnar_store = ColumnarStore(
+    getattr(settings, 'COLUMNAR_STORE_ROOT', os.path.join(settings.MEDIA_ROOT, 'columnar'))
+)
+
+# Background parsing, conversion and profiling of uploads
+upload_pipeline = JobManager(max_workers=getattr(settings, 'UPLOAD_WORKERS', 2))
+
+def refresh_status(dataset):
+    """Copy the upload pipeline's outcome onto a processing dataset once it has finished"""
+    if dataset.status != 'processing':
+        return dataset
+    progress = columnar_store.status(dataset.id)
+    if progress is None or progress['stage'] not in FINAL_STAGES:
+        return dataset
+    if progress['stage'] == 'failed':
+        changes = {'status': 'failed', 'error': progress['error'] or ''}
+    else:
+        changes = {
+            'status': 'ready',
+            'headers': progress['headers'],
+            'row_count': progress['row_count'],
+            'column_count': progress['column_count']
+        }
+    # Conditional update: concurrent requests apply the outcome once
+    Dataset.objects.filter(id=dataset.id, status='processing').update(**changes)
+    dataset.refresh_from_db()
+    return dataset
+
+def readiness_error(request, dataset):
+    """409/422 Response for a dataset that is processing or failed, else None
+    
+    Fails fast unless the request asks to ?wait= (seconds, capped at
+    READY_WAIT_MAX) for the pipeline to finish.
+    """
+    refresh_status(dataset)
+    if dataset.status == 'processing':
+        try:
+            wait = parse_wait(request.query_params.get('wait'), getattr(settings, 'READY_WAIT_MAX', 30))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        if wait:
+            with timed('wait'):
+                wait_until(lambda: refresh_status(dataset).status != 'processing', wait)
+    
+    if dataset.status == 'processing':
+        return Response({
+            'error': 'Dataset is still processing',
+            'status': dataset.status
+        }, status=409, headers={'Retry-After': '1'})
+    if dataset.status == 'failed':
+        return Response({'error': f'Dataset processing failed: {dataset.error}', 'status': dataset.status},
+                        status=422)
+    return None
+
+def _parse_dataset_file(path):
+    """Parse a stored dataset file"""
+    with timed('parse'):
+        if path.endswith('.csv'):
+            return pd.read_csv(path)
+        return pd.read_excel(path)
+
+def load_dataframe(dataset):
+    """Return the parsed DataFrame for a dataset, using the shared cache"""
+    if columnar_store.exists(dataset.id):
+        def reader(path):
+            with timed('read'):
+                return columnar_store.read(dataset.id)
+    else:
+        reader = _parse_dataset_file
+    return dataframe_cache.load(dataset.id, dataset.file.path, reader)
+
+def load_columns(dataset, columns):
+    """Return only the requested columns, memory-mapped when possible"""
+    if columnar_store.exists(dataset.id):
+        missing = [col for col in columns if col not in dataset.headers]
+        if missing:
+            raise KeyError(missing[0])
+        with timed('read'):
+            return columnar_store.read(dataset.id, columns)[columns]
+    return load_dataframe(dataset)[columns]
+
+def load_aligned(dataset, columns, date_column=None, join='inner', precision='float64'):
+    """Date-aligned (dates, prices, returns) for columns, built once per dataset version"""
+    return aligned_matrix(
+        lambda: load_columns(dataset, columns + ([date_column] if date_column else [])),
+        columns, date_column, join, precision, cache_key=(dataset.id, dataset.version)
+    )
+
+@receiver(post_delete, sender=Dataset)
+def invalidate_dataset_cache(sender, instance, **kwargs):
+    dataframe_cache.invalidate(instance.id)
+    matrix_cache.discard(lambda key: key[0] == instance.id)
+    columnar_store.delete(instance.id)
 
 class DatasetViewSet(viewsets.ModelViewSet):
     serializer_class = DatasetSerializer
@@ -101,147 +343,582 @@ class DatasetViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Dataset.objects.filter(user=self.request.user)
     
+    def list(self, request, *args, **kwargs):
+        # Pick up uploads that finished since anyone last looked at them
+        for dataset in self.get_queryset().filter(status='processing'):
+            refresh_status(dataset)
+        return super().list(request, *args, **kwargs)
+    
     @action(detail=False, methods=['post'])
     def upload(self, request):
+        """Store the file and answer 202; parsing continues in the background"""
         file = request.FILES.get('file')
         if not file:
             return Response({'error': 'No file provided'}, status=400)
         
+        if not file.name.endswith(('.csv', '.xlsx', '.xls')):
+            return Response({'error': 'Unsupported file format'}, status=400)
+        
         try:
-            # Parse file
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(file)
-            else:
-                return Response({'error': 'Unsupported file format'}, status=400)
-            
-            # Create dataset record
+            # Create dataset record; the pipeline fills in headers and counts
             dataset = Dataset.objects.create(
                 user=request.user,
                 name=file.name,
                 file=file,
-                headers=df.columns.tolist(),
-                row_count=len(df),
-                column_count=len(df.columns)
+                status='processing'
             )
             
+            queue_upload(columnar_store, dataset.id, dataset.name)
+            submit_upload(upload_pipeline, columnar_store, dataset.id, dataset.file.path,
+                          chunksize=getattr(settings, 'INGEST_CHUNK_ROWS', 100_000))
+            
             return Response({
                 'id': dataset.id,
                 'name': dataset.name,
-                'headers': dataset.headers,
-                'rows': df.head(50).values.tolist(),
-                'row_count': dataset.row_count,
-                'column_count': dataset.column_count
-            })
+                'status': dataset.status,
+                'status_url': f'/api/datasets/{dataset.id}/status/'
+            }, status=202, headers={'Location': f'/api/datasets/{dataset.id}/status/'})
             
         except Exception as e:
             return Response({'error': str(e)}, status=500)
     
+    @action(detail=True, methods=['get'], url_path='status')
+    def processing_status(self, request, pk=None):
+        """Upload processing stage and progress (the column profile once ready)"""
+        dataset = refresh_status(self.get_object())
+        progress = columnar_store.status(dataset.id) or {}
+        profile = None
+        if dataset.status == 'ready' and columnar_store.exists(dataset.id):
+            with timed('profile'):
+                profile = load_profile(columnar_store, dataset.id, dataset.version)
+        return Response({
+            'id': dataset.id,
+            'name': dataset.name,
+            'status': dataset.status,
+            'stage': progress.get('stage', 'ready'),
+            'progress': progress.get('progress', 1.0),
+            'rows_parsed': progress.get('rows_parsed', dataset.row_count),
+            'error': dataset.error or None,
+            'row_count': dataset.row_count,
+            'column_count': dataset.column_count,
+            'headers': dataset.headers,
+            'dtypes': progress.get('dtypes'),
+            'numeric_columns': profile['numeric_columns'] if profile else None,
+            'profile': profile['columns'] if profile else None,
+            'uploaded_at': dataset.uploaded_at,
+            'updated_at': progress.get('updated_at')
+        })
+    
     @action(detail=True, methods=['get'])
     def data(self, request, pk=None):
         dataset = self.get_object()
+        params = request.query_params
+        
+        not_ready = readiness_error(request, dataset)
+        if not_ready is not None:
+            return not_ready
+        
+        try:
+            offset, limit, columns = parse_row_window(params, dataset.headers)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        # DRF reserves ?format= and Accept for renderer negotiation, so use ?stream=
+        fmt = params.get('stream', 'json')
+        if fmt not in ('json', 'ndjson', 'arrow'):
+            return Response({'error': f'Unsupported format {fmt}'}, status=400)
+        if fmt == 'arrow' and pa is None:
+            return Response({'error': 'Arrow responses require pyarrow'}, status=406)
+        
         try:
-            if dataset.file.name.endswith('.csv'):
-                df = pd.read_csv(dataset.file.path)
-            else:
-                df = pd.read_excel(dataset.file.path)
+            df = load_columns(dataset, columns)
+            window = df.iloc[offset:None if limit is None else offset + limit]
+            
+            if fmt != 'json':
+                stream = iter_ndjson(window) if fmt == 'ndjson' else iter_arrow_ipc(window)
+                mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else ARROW_MIMETYPE
+                response = StreamingHttpResponse(stream, content_type=mimetype)
+                response['X-Total-Count'] = str(dataset.row_count)
+                return response
             
             return Response({
-                'headers': df.columns.tolist(),
-                'rows': df.values.tolist()
+                'headers': columns,
+                'rows': window.to_numpy(),
+                'offset': offset,
+                'limit': limit,
+                'row_count': dataset.row_count
             })
         except Exception as e:
             return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        return Response(dataframe_cache.stats())
+
+class AnalysisHistoryPagination(CursorPagination):
+    """Keyset pagination: each page starts after the previous page's last row
+
+    Pages cost the same however deep the history, since nothing is
+    counted or skipped with OFFSET.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-created_at', '-id')
 
 class AnalysisViewSet(viewsets.ModelViewSet):
     serializer_class = AnalysisSerializer
+    pagination_class = AnalysisHistoryPagination
+    # Rows per bulk INSERT and hashes per IN (...) lookup, within SQLite's variable limit
+    BULK_BATCH_SIZE = 500
     
     def get_queryset(self):
-        return Analysis.objects.filter(dataset__user=self.request.user)
+        queryset = Analysis.objects.filter(dataset__user=self.request.user)
+        if self.action != 'list':
+            return queryset
+        
+        # ?dataset= and ?analysis_type= use the (dataset, analysis_type, created_at) index
+        dataset_id = self.request.query_params.get('dataset')
+        analysis_type = self.request.query_params.get('analysis_type')
+        if dataset_id:
+            if not dataset_id.isdigit():
+                raise ValidationError({'dataset': 'must be a dataset id'})
+            queryset = queryset.filter(dataset_id=int(dataset_id))
+        if analysis_type:
+            queryset = queryset.filter(analysis_type=analysis_type)
+        return queryset.defer('results')
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AnalysisSummarySerializer
+        return AnalysisSerializer
     
     @action(detail=False, methods=['post'])
     def risk_metrics(self, request):
         dataset_id = request.data.get('dataset_id')
         column = request.data.get('column')
         
-        try:
-            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
-            df = pd.read_csv(dataset.file.path) if dataset.file.name.endswith('.csv') else pd.read_excel(dataset.file.path)
+        def compute():
+            df = load_columns(dataset, [column])
             
             data = df[column].dropna().values
             returns = np.diff(data) / data[:-1]
             
-            metrics = {
+            return {
                 'mean': float(np.mean(returns) * 252),
                 'volatility': float(np.std(returns) * np.sqrt(252)),
                 'sharpe_ratio': float((np.mean(returns) * 252) / (np.std(returns) * np.sqrt(252))),
                 'var_95': float(np.percentile(returns, 5)),
                 'max_drawdown': self._calculate_max_drawdown(data)
             }
+        
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            return self._memoized(request, dataset, 'risk', {'column': column}, compute)
             
-            # Save analysis
-            analysis = Analysis.objects.create(
-                dataset=dataset,
-                analysis_type='risk',
-                parameters={'column': column},
-                results=metrics
-            )
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['post'])
+    def batch_risk_metrics(self, request):
+        dataset_id = request.data.get('dataset_id')
+        columns = request.data.get('columns')
+        
+        try:
+            alignment = alignment_params(request.data, default_join='pairwise')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            if not columns:
+                if columnar_store.exists(dataset.id):
+                    columns = load_profile(columnar_store, dataset.id, dataset.version)['numeric_columns']
+                else:
+                    columns = load_dataframe(dataset).select_dtypes(include=[np.number]).columns.tolist()
             
-            return Response(metrics)
+            def compute():
+                _, prices, returns = load_aligned(dataset, columns, **alignment)
+                metrics = {name: nan_to_none(values) for name, values in compute_batch_risk(prices).items()}
+                return {
+                    'columns': columns,
+                    'metrics': {
+                        col: {name: values[i] for name, values in metrics.items()}
+                        for i, col in enumerate(columns)
+                    },
+                    'correlation': nan_to_none(pairwise_correlation(returns))
+                }
+            
+            return self._memoized(request, dataset, 'risk', {'columns': columns, **alignment}, compute)
             
         except Exception as e:
             return Response({'error': str(e)}, status=500)
     
     @action(detail=False, methods=['post'])
-    def optimize_portfolio(self, request):
+    def rolling_risk(self, request):
         dataset_id = request.data.get('dataset_id')
-        columns = request.data.get('columns', [])
-        method = request.data.get('method', 'equal_weight')
+        column = request.data.get('column')
+        max_points = request.data.get('max_points', 500)
+        
+        try:
+            window = int(request.data.get('window', 63))
+            max_points = int(max_points) if max_points else None
+        except (TypeError, ValueError):
+            return Response({'error': 'window and max_points must be integers'}, status=400)
+        
+        if window < 2:
+            return Response({'error': 'window must be at least 2'}, status=400)
         
         try:
             dataset = Dataset.objects.get(id=dataset_id, user=request.user)
-            df = pd.read_csv(dataset.file.path) if dataset.file.name.endswith('.csv') else pd.read_excel(dataset.file.path)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            series = load_columns(dataset, [column])[column].dropna()
+            prices = series.to_numpy(dtype=float)
             
-            # Calculate returns for each asset
-            returns_data = []
-            for col in columns:
-                prices = df[col].dropna().values
-                returns = np.diff(prices) / prices[:-1]
-                returns_data.append(returns)
+            if len(prices) < window + 2:
+                return Response({'error': 'Insufficient data points for window'}, status=400)
             
-            # Equal weight portfolio
-            weights = [1.0 / len(columns)] * len(columns)
-            
-            # Calculate portfolio metrics
-            portfolio_return = sum(w * np.mean(r) * 252 for w, r in zip(weights, returns_data))
-            portfolio_vol = np.std(np.sum([w * r for w, r in zip(weights, returns_data)], axis=0)) * np.sqrt(252)
+            metrics = compute_rolling_risk(prices, window)
+            positions = series.index.to_numpy()[window:]
+            keep = downsample_indices(len(positions), max_points)
             
             result = {
-                'weights': weights,
-                'expected_return': float(portfolio_return),
-                'volatility': float(portfolio_vol),
-                'sharpe_ratio': float(portfolio_return / portfolio_vol) if portfolio_vol > 0 else 0
+                'column': column,
+                'window': window,
+                'total_points': len(positions),
+                'index': positions[keep]
             }
+            for name, values in metrics.items():
+                result[name] = values[keep]
             
-            # Save analysis
-            Analysis.objects.create(
-                dataset=dataset,
-                analysis_type='portfolio',
-                parameters={'columns': columns, 'method': method},
-                results=result
+            return Response(result)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['post'])
+    def monte_carlo_var(self, request):
+        dataset_id = request.data.get('dataset_id')
+        columns = request.data.get('columns') or ([request.data['column']] if request.data.get('column') else [])
+        
+        if not columns:
+            return Response({'error': 'column or columns parameter required'}, status=400)
+        
+        try:
+            params = parse_simulation_params(request.data, getattr(settings, 'MAX_SIMULATION_PATHS', 5_000_000))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        params['columns'] = list(columns)
+        
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            
+            def compute():
+                prices = load_columns(dataset, columns).dropna().to_numpy(dtype=float)
+                return simulate_var(prices, params['weights'], params['method'], params['horizon'],
+                                    params['paths'], params['seed'], tuple(params['confidence_levels']))
+            
+            if params['seed'] is None:
+                return Response(compute())
+            return self._memoized(request, dataset, 'risk', params, compute)
+            
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['post'])
+    def optimize_portfolio(self, request):
+        dataset_id = request.data.get('dataset_id')
+        columns = request.data.get('columns', [])
+        method = request.data.get('method', 'equal_weight')
+        risk_free = float(request.data.get('risk_free_rate', 0.0))
+        
+        if len(columns) < 2:
+            return Response({'error': 'At least 2 columns required'}, status=400)
+        
+        try:
+            method = normalize_method(method)
+            alignment = alignment_params(request.data, joins=('inner', 'outer'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        def compute():
+            _, _, returns = load_aligned(dataset, columns, **alignment)
+            cache_key = (dataset.id, dataset.version, tuple(columns), *alignment.values())
+            return compute_portfolio(returns, columns, method, risk_free, cache_key)
+        
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            params = {'columns': columns, 'method': method, 'risk_free_rate': risk_free, **alignment}
+            return self._memoized(request, dataset, 'portfolio', params, compute)
+            
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['post'])
+    def portfolio_backtest(self, request):
+        dataset_id = request.data.get('dataset_id')
+        
+        try:
+            params = parse_portfolio_params(request.data)
+            params['method'] = normalize_method(params['method'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        columns = params['columns']
+        date_column = params['date_column']
+        
+        def compute():
+            dates, prices, _ = load_aligned(dataset, columns, date_column, params['join'])
+            return compute_portfolio_backtest(
+                prices, columns, params['method'], params['rebalance'], params['lookback'],
+                params['cost_bps'], params['slippage_bps'], params['weights'], dates,
+                params['reestimate'], params['risk_free_rate'], params['max_points']
             )
+        
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            return self._memoized(request, dataset, 'backtest', params, compute)
             
-            return Response(result)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['post'])
+    def backtest_sweep(self, request):
+        dataset_id = request.data.get('dataset_id')
+        price_column = request.data.get('price_column')
+        strategy_types = list(dict.fromkeys(request.data.get('strategy_types', ['sma', 'momentum'])))
+        rank_by = request.data.get('rank_by', 'sharpe_ratio')
+        limit = request.data.get('limit')
+        
+        if not price_column:
+            return Response({'error': 'price_column required'}, status=400)
+        
+        for strategy_type in strategy_types:
+            if strategy_type not in STRATEGIES:
+                return Response({'error': f'Unknown strategy {strategy_type}'}, status=400)
+        
+        if rank_by not in ('total_return', 'sharpe_ratio', 'max_drawdown'):
+            return Response({'error': f'Cannot rank by {rank_by}'}, status=400)
+        
+        try:
+            windows = parse_parameter_grid(
+                request.data.get('parameters', {'start': 5, 'stop': 200, 'step': 5}),
+                getattr(settings, 'MAX_SWEEP_COMBINATIONS', 5000) // max(1, len(strategy_types))
+            )
+            limit = parse_limit(limit)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=400)
+        
+        # Each combination is stored as its own backtest, so overlapping sweeps reuse them
+        combinations = [
+            {'price_column': price_column, 'strategy_type': strategy_type,
+             'parameter': None if strategy_type == 'buyhold' else window}
+            for strategy_type in strategy_types
+            # Buy and hold has no window, so it is evaluated once
+            for window in ([windows[0]] if strategy_type == 'buyhold' else windows)
+        ]
+        
+        def compute(missing):
+            prices = load_columns(dataset, [price_column])[price_column].dropna().to_numpy(dtype=float)
+            if len(prices) < 50:
+                raise ValueError('Insufficient data for backtesting')
+            results = [None] * len(missing)
+            for strategy_type in strategy_types:
+                positions = [i for i, params in enumerate(missing) if params['strategy_type'] == strategy_type]
+                if not positions:
+                    continue
+                grid = [missing[i]['parameter'] or windows[0] for i in positions]
+                metrics = sweep_backtests(prices, strategy_type, grid)
+                for j, i in enumerate(positions):
+                    results[i] = {name: float(values[j]) for name, values in metrics.items()}
+            return results
+        
+        try:
+            dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+            not_ready = readiness_error(request, dataset)
+            if not_ready is not None:
+                return not_ready
+            results = self._memoized_many(dataset, 'backtest', combinations, compute)
+            
+            rows = [
+                {'strategy_type': params['strategy_type'], 'parameter': params['parameter'], **metrics}
+                for params, metrics in zip(combinations, results)
+            ]
+            # Lower drawdown is better; higher is better for the others
+            rows.sort(key=lambda row: row[rank_by], reverse=rank_by != 'max_drawdown')
+            for rank, row in enumerate(rows, start=1):
+                row['rank'] = rank
+            
+            return Response({
+                'price_column': price_column,
+                'ranked_by': rank_by,
+                'combinations': len(rows),
+                'results': rows if limit is None else rows[:limit]
+            })
             
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
     
+    def _memoized(self, request, dataset, analysis_type, params, compute):
+        """Reuse the stored Analysis for identical inputs, computing and saving it otherwise
+        
+        The ETag is the content address of the inputs, so clients sending
+        it back in If-None-Match get a bodiless 304.
+        """
+        key = params_hash(dataset.version, analysis_type, params)
+        etag = f'"{key}"'
+        if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), key):
+            return Response(status=304, headers={'ETag': etag})
+        
+        results = (Analysis.objects
+                   .filter(dataset=dataset, analysis_type=analysis_type, params_hash=key)
+                   .values_list('results', flat=True)
+                   .first())
+        if results is None:
+            results = compute()
+            Analysis.objects.create(
+                dataset=dataset,
+                analysis_type=analysis_type,
+                parameters=params,
+                results=results,
+                params_hash=key
+            )
+        return Response(results, headers={'ETag': etag})
+    
+    def _memoized_many(self, dataset, analysis_type, params_list, compute):
+        """Stored results for many parameter sets, computing the missing ones together
+        
+        compute(missing_params) returns results in the same order. Stored
+        rows are looked up in chunks of hashes and new ones written with
+        one bulk_create, instead of a query and an INSERT per set.
+        """
+        keys = [params_hash(dataset.version, analysis_type, params) for params in params_list]
+        stored = {}
+        for start in range(0, len(keys), self.BULK_BATCH_SIZE):
+            stored.update(Analysis.objects
+                          .filter(dataset=dataset, analysis_type=analysis_type,
+                                  params_hash__in=keys[start:start + self.BULK_BATCH_SIZE])
+                          .values_list('params_hash', 'results'))
+        
+        missing = [i for i, key in enumerate(keys) if key not in stored]
+        if missing:
+            computed = compute([params_list[i] for i in missing])
+            Analysis.objects.bulk_create(
+                [
+                    Analysis(dataset=dataset, analysis_type=analysis_type, parameters=params_list[i],
+                             results=results, params_hash=keys[i])
+                    for i, results in zip(missing, computed)
+                ],
+                batch_size=self.BULK_BATCH_SIZE
+            )
+            stored.update((keys[i], results) for i, results in zip(missing, computed))
+        return [stored[key] for key in keys]
+    
     def _calculate_max_drawdown(self, prices):
         cummax = np.maximum.accumulate(prices)
         drawdown = (cummax - prices) / cummax
         return float(np.max(drawdown))
 
+def metrics(request):
+    """Request and stage duration histograms in Prometheus text format"""
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_MIMETYPE)
+
+# renderers.py
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from serialization import dumps_json, dumps_msgpack, encode_default, MSGPACK_MIMETYPE
+
+def _default(obj):
+    # Lazy translation strings appear in DRF error details
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    return encode_default(obj)
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON through serialization.dumps_json (orjson, NaN-safe, NumPy-aware)"""
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with timed('serialize'):
+            return dumps_json(data, default=_default)
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack for Accept: application/msgpack or ?format=msgpack
+    
+    ?precision=float32 packs floats in 4 bytes for long time series.
+    """
+    media_type = MSGPACK_MIMETYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        request = (renderer_context or {}).get('request')
+        single_float = request is not None and request.query_params.get('precision') == 'float32'
+        with timed('serialize'):
+            return dumps_msgpack(data, single_float=single_float, default=_default)
+
+# middleware.py
+from django.conf import settings
+from instrumentation import RequestTimer, observe_request, start_profiler, profile_summary
+
+class ServerTimingMiddleware:
+    """Per-request stage timings as a Server-Timing header and /api/metrics histograms
+    
+    With ALLOW_PROFILING, ?profile=1 replaces the body with a cProfile
+    summary of the request.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        timer = RequestTimer()
+        profiler = None
+        if getattr(settings, 'ALLOW_PROFILING', settings.DEBUG) and request.GET.get('profile') == '1':
+            profiler = start_profiler()
+        
+        response = self.get_response(request)
+        total = timer.finish()
+        match = request.resolver_match
+        endpoint = match.route if match else 'unmatched'
+        observe_request(endpoint, request.method, response.status_code, total, timer.stages)
+        
+        if profiler is not None:
+            response = HttpResponse(profile_summary(profiler), status=response.status_code,
+                                    content_type='text/plain')
+        response['Server-Timing'] = timer.server_timing(total)
+        return response
+
 # urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
@@ -251,5 +928,6 @@ router.register(r'datasets', DatasetViewSet, basename='dataset')
 router.register(r'analysis', AnalysisViewSet, basename='analysis')
 
 urlpatterns = [
+    path('api/metrics', metrics),
     path('api/', include(router.urls)),
 ]
@@ -1,40 +1,385 @@
 # Flask Backend for Quantitative Investment Platform
 # Install: pip install flask flask-cors pandas numpy werkzeug
+# Optional: pip install pyarrow (Arrow IPC dataset responses)
+# Optional: pip install orjson msgpack (faster JSON, MessagePack responses)
+# Optional: pip install scipy (Cholesky solves in the portfolio optimizer)
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import pandas as pd
 import numpy as np
 import os
 import io
+import functools
 from datetime import datetime
 import tempfile
+import uuid
+from storage import ColumnarStore, DatasetRegistry, ingest_csv, numeric_columns
+from caching import LRUCache, params_hash, canonical_params, series_nbytes
+from backtesting import (sweep_backtests, parse_parameter_grid, parse_portfolio_params, parse_backtest_params,
+                         STRATEGIES)
+from analytics import (compute_risk_metrics, compute_portfolio, compute_backtest,
+                       compute_rolling_risk, downsample_indices, compute_batch_risk, pairwise_correlation,
+                       compute_portfolio_backtest)
+from alignment import aligned_matrix, alignment_params, matrix_cache
+from incremental import RiskAccumulator, BacktestAccumulator
+from simulation import simulate_var, parse_simulation_params, DEFAULT_BATCH_PATHS
+from pipeline import queue_upload, submit_upload, parse_wait, wait_until, FINAL_STAGES
+from profiling import load_profile, refresh_profile
+from instrumentation import (RequestTimer, timed, observe_request, render_metrics,
+                             start_profiler, profile_summary, PROMETHEUS_MIMETYPE)
+from jobs import JobManager, JobQueueFull, required_columns, parse_timeout
+from optimization import normalize_method, parse_optimization_params
+from serialization import (parse_row_window, parse_limit, response_format, iter_ndjson, iter_arrow_ipc,
+                           dumps_json, dumps_msgpack, NDJSON_MIMETYPE, ARROW_MIMETYPE,
+                           MSGPACK_MIMETYPE, pa, msgpack)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify through serialization.dumps_json (orjson, NaN-safe, NumPy-aware)
+
+    Clients sending Accept: application/msgpack (or ?format=msgpack) get
+    MessagePack instead; ?precision=float32 halves the size of floats.
+    Encoding is recorded as the 'serialize' request stage.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps_json(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with timed('serialize'):
+            if msgpack is not None and has_request_context() and \
+                    response_format(request.args, request.headers.get('Accept', '')) == 'msgpack':
+                body = dumps_msgpack(obj, single_float=request.args.get('precision') == 'float32')
+                response = self._app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+            else:
+                response = self._app.response_class(dumps_json(obj), mimetype=self.mimetype)
+        response.vary.add('Accept')
+        return response
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Configuration
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 4 * 1024 * 1024 * 1024  # 4GB max file size (CSV is streamed)
+app.config['MAX_IN_MEMORY_UPLOAD'] = 50 * 1024 * 1024  # Excel files are parsed whole
+app.config['INGEST_CHUNK_ROWS'] = 100_000
+app.config['RESULT_CACHE_ENTRIES'] = 1024
+app.config['ACCUMULATOR_MEMORY_BUDGET'] = 256 * 1024 * 1024  # bytes of incremental analysis state
+app.config['DATASET_MEMORY_BUDGET'] = 1024 * 1024 * 1024  # bytes of loaded columns per process
 app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+app.config['COLUMNAR_FOLDER'] = os.path.join(tempfile.gettempdir(), 'quant_columnar')
+app.config['MAX_SWEEP_COMBINATIONS'] = 5000
+app.config['MAX_SIMULATION_PATHS'] = 5_000_000
+app.config['JOB_WORKERS'] = min(4, os.cpu_count() or 1)
+app.config['JOB_MAX_PENDING'] = 100
+app.config['JOB_TIMEOUT'] = 300  # seconds
+app.config['UPLOAD_WORKERS'] = min(2, os.cpu_count() or 1)
+app.config['READY_WAIT_MAX'] = 30  # seconds a request may wait (?wait=) for a processing upload or job
+app.config['ALLOW_PROFILING'] = True  # ?profile=1 returns a cProfile summary; disable in production
+
+# Typed per-column copies of each upload, memory-mapped by the analyses
+columnar_store = ColumnarStore(app.config['COLUMNAR_FOLDER'])
+
+# Dataset index kept in the store, so every worker process sees every
+# upload and maps the same column files instead of holding its own copy
+datasets = DatasetRegistry(columnar_store)
+
+# Columns loaded by recent requests, accounted with memory_usage(deep=True);
+# least recently used ones are dropped and re-read from the store on demand
+column_cache = LRUCache(app.config['DATASET_MEMORY_BUDGET'], sizeof=series_nbytes)
+
+# Memoized analysis results keyed by (dataset id, content hash)
+result_cache = LRUCache(app.config['RESULT_CACHE_ENTRIES'])
 
-# In-memory storage
-datasets = {}
+# Running state of cached analyses, folded forward when rows are appended;
+# risk state keeps every return, so entries are accounted by size
+accumulators = LRUCache(app.config['ACCUMULATOR_MEMORY_BUDGET'], sizeof=lambda entry: entry[3].nbytes)
+
+# Process pool for CPU-heavy analyses submitted as jobs
+job_manager = JobManager(
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+    default_timeout=app.config['JOB_TIMEOUT']
+)
+
+# Separate pool for upload processing, so parsing never queues behind analyses
+upload_pipeline = JobManager(max_workers=app.config['UPLOAD_WORKERS'])
 
 # Helper functions
-def calculate_returns(prices):
-    """Calculate simple returns"""
-    return np.diff(prices) / prices[:-1]
+def new_dataset_id():
+    """Unique dataset id (timestamps collide for uploads in the same second)"""
+    return f"ds_{uuid.uuid4().hex}"
+
+def load_column(dataset_id, column):
+    """Load one column, memory-mapped from the columnar store"""
+    return get_dataframe(dataset_id, [column])[column]
+
+def load_prices(dataset_id, column):
+    """Non-missing values of a column as float64 (stored columns may be downcast)"""
+    series = load_column(dataset_id, column)
+    with timed('dropna'):
+        return series.dropna().to_numpy(dtype=float)
+
+def load_aligned(dataset_id, columns, date_column=None, join='inner', precision='float64'):
+    """Date-aligned (dates, prices, returns) for columns, built once per dataset version"""
+    return aligned_matrix(
+        lambda: get_dataframe(dataset_id, columns + ([date_column] if date_column else [])),
+        columns, date_column, join, precision, cache_key=(dataset_id, datasets[dataset_id]['version'])
+    )
+
+def get_dataframe(dataset_id, columns=None):
+    """Dataset columns (default all, in requested order) through the column cache
+
+    Cached columns are keyed by dataset version, so appended rows and
+    other workers' changes are picked up; only missing columns are read
+    from the store.
+    """
+    version = datasets[dataset_id]['version']
+    if columns is None:
+        columns = datasets[dataset_id]['headers']
+    loaded = {col: column_cache.get((dataset_id, version, col)) for col in columns}
+    missing = [col for col, series in loaded.items() if series is None]
+    if missing:
+        column_cache.discard(lambda key: key[0] == dataset_id and key[1] != version)
+        with timed('read'):
+            df = columnar_store.read(dataset_id, missing)
+        for col in missing:
+            loaded[col] = df[col]
+            column_cache.put((dataset_id, version, col), df[col])
+    return pd.DataFrame(loaded, copy=False)
+
+def memoized_response(dataset_id, endpoint, params, compute):
+    """Serve an analysis from the result cache, honouring If-None-Match
+
+    The ETag is the content address of the inputs (dataset version,
+    endpoint and canonical parameters), so a client holding it can skip
+    both the computation and the transfer.
+    """
+    key = params_hash(datasets[dataset_id]['version'], endpoint, params)
+    if request.if_none_match.contains(key):
+        response = Response(status=304)
+        response.set_etag(key)
+        return response
+    
+    result = result_cache.get((dataset_id, key))
+    if result is None:
+        result = compute()
+        result_cache.put((dataset_id, key), result)
+    
+    response = jsonify(result)
+    response.set_etag(key)
+    return response
+
+def load_versioned_prices(dataset_id, column):
+    """Prices of a column together with the dataset version they belong to"""
+    with datasets.lock(dataset_id, shared=True):
+        return datasets[dataset_id]['version'], load_prices(dataset_id, column)
+
+def track_incremental(dataset_id, version, endpoint, params, column, accumulator):
+    """Keep an analysis' accumulator so appended rows can update its result"""
+    key = (dataset_id, endpoint, canonical_params(params))
+    accumulators.put(key, (version, params, column, accumulator))
+
+def refresh_incremental(dataset_id, chunks, version):
+    """Fold appended rows into every tracked analysis of a dataset
+
+    chunks are the appended frames in order; version is the dataset
+    version they were appended to. Refreshed results are cached under
+    the next version so the following request is a cache hit.
+    """
+    refreshed = 0
+    for key, (acc_version, params, column, accumulator) in accumulators.items(lambda k: k[0] == dataset_id):
+        if acc_version != version:
+            accumulators.pop(key)
+            continue
+        for chunk in chunks:
+            prices = pd.to_numeric(chunk[column], errors='coerce').dropna().to_numpy(dtype=float)
+            accumulator.update(prices)
+        accumulators.put(key, (version + 1, params, column, accumulator))
+        result_cache.put((dataset_id, params_hash(version + 1, key[1], params)), accumulator.result())
+        refreshed += 1
+    return refreshed
+
+def parse_appended_rows(headers):
+    """Appended rows from a JSON body ({rows: [[...]]} or {records: [{...}]}) or a CSV body
+
+    Returns a list of DataFrames with the dataset's columns in order.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    if request.mimetype == 'text/csv':
+        chunks = []
+        for chunk in pd.read_csv(request.stream, chunksize=app.config['INGEST_CHUNK_ROWS']):
+            if sorted(chunk.columns) != sorted(headers):
+                raise ValueError('CSV columns must match the dataset headers')
+            chunks.append(chunk[headers])
+        return chunks
+    
+    data = request.get_json(silent=True) or {}
+    if 'records' in data:
+        records = data['records']
+        unknown = {col for record in records for col in record} - set(headers)
+        if unknown:
+            raise ValueError(f'Column {sorted(unknown)[0]} not found')
+        return [pd.DataFrame.from_records(records, columns=headers)]
+    rows = data.get('rows', [])
+    if any(len(row) != len(headers) for row in rows):
+        raise ValueError(f'Each row must have {len(headers)} values')
+    return [pd.DataFrame(rows, columns=headers)]
+
+def register_dataset(dataset_id, name, meta, preview):
+    """Record an ingested dataset and build the upload response"""
+    datasets[dataset_id] = {
+        'name': secure_filename(name),
+        'headers': [info['name'] for info in meta['columns']],
+        'row_count': meta['row_count'],
+        'column_count': len(meta['columns']),
+        'uploaded_at': datetime.now().isoformat(),
+        'version': 1,
+        'status': 'ready'
+    }
+    ds = datasets[dataset_id]
+    return {
+        'id': dataset_id,
+        'name': ds['name'],
+        'headers': ds['headers'],
+        'rows': preview.to_numpy(),
+        'row_count': ds['row_count'],
+        'column_count': ds['column_count'],
+        'numeric_columns': numeric_columns(meta),
+        'uploaded_at': ds['uploaded_at']
+    }
+
+def get_profile(dataset_id):
+    """Column profile of the dataset's current version (built once per version)"""
+    with timed('profile'):
+        return load_profile(columnar_store, dataset_id, datasets[dataset_id]['version'])
 
-def calculate_max_drawdown(prices):
-    """Calculate maximum drawdown"""
-    cummax = np.maximum.accumulate(prices)
-    drawdown = (cummax - prices) / cummax
-    return float(np.max(drawdown))
+def column_error(dataset_id, columns, numeric=True):
+    """400 response for a requested column that is missing or not numeric, else None
+
+    Checked against the stored profile without reading any column data;
+    column types never change on append, so an older version's profile
+    is as good as the current one.
+    """
+    profile = columnar_store.profile(dataset_id) or get_profile(dataset_id)
+    for col in columns:
+        stats = profile['columns'].get(col)
+        if stats is None:
+            return jsonify({'error': f'Column {col} not found'}), 400
+        if numeric and stats['type'] != 'numeric':
+            return jsonify({'error': f'Column {col} is not numeric'}), 400
+    return None
+
+def refresh_status(dataset_id):
+    """Dataset info, folding in the upload pipeline's outcome once it has finished"""
+    ds = datasets[dataset_id]
+    if ds.get('status', 'ready') != 'processing':
+        return ds
+    progress = columnar_store.status(dataset_id)
+    if progress is None or progress['stage'] not in FINAL_STAGES:
+        return ds
+    with datasets.lock(dataset_id):
+        ds = datasets[dataset_id]
+        if ds['status'] != 'processing':
+            return ds
+        if progress['stage'] == 'failed':
+            return datasets.update(dataset_id, status='failed', error=progress['error'])
+        return datasets.update(
+            dataset_id,
+            status='ready',
+            headers=progress['headers'],
+            row_count=progress['row_count'],
+            column_count=progress['column_count']
+        )
+
+def readiness_error(dataset_id):
+    """Error response for a dataset whose upload is processing or failed, else None
+
+    Fails fast unless the request asks to ?wait= (seconds, capped at
+    READY_WAIT_MAX) for the pipeline to finish.
+    """
+    ds = refresh_status(dataset_id)
+    if ds.get('status', 'ready') == 'processing':
+        try:
+            wait = parse_wait(request.args.get('wait'), app.config['READY_WAIT_MAX'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if wait:
+            with timed('wait'):
+                wait_until(lambda: refresh_status(dataset_id).get('status') != 'processing', wait)
+            ds = refresh_status(dataset_id)
+    
+    status = ds.get('status', 'ready')
+    if status == 'processing':
+        response = jsonify({
+            'error': 'Dataset is still processing',
+            'status': status,
+            'status_url': f'/api/datasets/{dataset_id}/status'
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    if status == 'failed':
+        return jsonify({'error': f"Dataset processing failed: {ds.get('error')}", 'status': status}), 422
+    return None
 
-def calculate_moving_average(data, window):
-    """Calculate moving average"""
-    return np.convolve(data, np.ones(window)/window, mode='valid')
+def requires_ready(view):
+    """Route decorator answering 409/422 until the dataset's upload is processed"""
+    @functools.wraps(view)
+    def wrapper(dataset_id, *args, **kwargs):
+        if dataset_id in datasets:
+            error = readiness_error(dataset_id)
+            if error is not None:
+                return error
+        return view(dataset_id, *args, **kwargs)
+    return wrapper
+
+def parse_risk_params(data):
+    if not data.get('column'):
+        raise ValueError('Column parameter required')
+    return {'column': data['column']}
+
+def parse_var_params(data):
+    columns = data.get('columns') or ([data['column']] if data.get('column') else [])
+    if not columns:
+        raise ValueError('column or columns parameter required')
+    params = parse_simulation_params(data, app.config['MAX_SIMULATION_PATHS'])
+    params['columns'] = list(columns)
+    return params
+
+def parse_portfolio_backtest_params(data):
+    params = parse_portfolio_params(data)
+    params['method'] = normalize_method(params['method'])
+    return params
+
+# Request validation per job type, shared by the endpoints and /api/jobs
+JOB_PARAMS = {
+    'risk_metrics': parse_risk_params,
+    'optimize_portfolio': parse_optimization_params,
+    'backtest': parse_backtest_params,
+    'monte_carlo_var': parse_var_params,
+    'portfolio_backtest': parse_portfolio_backtest_params,
+}
+
+def submit_job(task_name, dataset_id, params, timeout=None):
+    """Queue an analysis on the process pool and return a 202 response
+
+    timeout may shorten JOB_TIMEOUT but not extend it.
+    """
+    try:
+        timeout = parse_timeout(timeout, app.config['JOB_TIMEOUT'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        job = job_manager.submit(task_name, (columnar_store.root, dataset_id), params, timeout)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response, 202
 
 # Error handler
 @app.errorhandler(Exception)
@@ -45,6 +390,30 @@ def handle_error(error):
     }
     return jsonify(response), 500
 
+# Instrumentation
+@app.before_request
+def start_timing():
+    g.timer = RequestTimer()
+    g.profiler = None
+    if app.config['ALLOW_PROFILING'] and request.args.get('profile') == '1':
+        g.profiler = start_profiler()
+
+@app.after_request
+def record_timing(response):
+    """Server-Timing header, per-endpoint histograms and the optional profile"""
+    timer = g.pop('timer', None)
+    if timer is None:
+        return response
+    total = timer.finish()
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(endpoint, request.method, response.status_code, total, timer.stages)
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response = Response(profile_summary(profiler), status=response.status_code, mimetype='text/plain')
+    response.headers['Server-Timing'] = timer.server_timing(total)
+    return response
+
 # Routes
 @app.route('/')
 def index():
@@ -54,15 +423,26 @@ def index():
         'endpoints': {
             'upload': '/api/upload',
             'datasets': '/api/datasets',
+            'status': '/api/datasets/<id>/status',
+            'append_rows': '/api/datasets/<id>/rows',
             'risk': '/api/datasets/<id>/risk-metrics',
+            'monte_carlo_var': '/api/datasets/<id>/monte-carlo-var',
             'portfolio': '/api/datasets/<id>/optimize-portfolio',
-            'backtest': '/api/datasets/<id>/backtest'
+            'backtest': '/api/datasets/<id>/backtest',
+            'backtest_sweep': '/api/datasets/<id>/backtest/sweep',
+            'backtest_portfolio': '/api/datasets/<id>/backtest/portfolio',
+            'jobs': '/api/jobs'
         }
     })
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Upload and parse data file"""
+    """Upload a data file; parsing and profiling continue in the background
+
+    Returns 202 with the dataset id once the file is on disk. Poll
+    /api/datasets/<id>/status for progress; analyses answer 409 until
+    the dataset is ready.
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -70,42 +450,66 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'Empty filename'}), 400
     
+    if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
+        return jsonify({'error': 'Unsupported file format'}), 400
+    
+    if not file.filename.endswith('.csv') and request.content_length and \
+            request.content_length > app.config['MAX_IN_MEMORY_UPLOAD']:
+        # Excel files are parsed whole, in the memory of a pipeline worker
+        return jsonify({'error': 'Excel file too large; upload as CSV instead'}), 413
+    
+    # Generate dataset ID
+    dataset_id = new_dataset_id()
+    name = secure_filename(file.filename)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f"{dataset_id}{os.path.splitext(name)[1]}")
+    
     try:
-        # Read file
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
-        else:
-            return jsonify({'error': 'Unsupported file format'}), 400
-        
-        # Generate dataset ID
-        dataset_id = f"ds_{int(datetime.now().timestamp())}"
+        with timed('receive'):
+            file.save(path)
         
-        # Store dataset
+        queue_upload(columnar_store, dataset_id, name)
         datasets[dataset_id] = {
-            'name': secure_filename(file.filename),
-            'dataframe': df,
-            'headers': df.columns.tolist(),
-            'row_count': len(df),
-            'column_count': len(df.columns),
-            'uploaded_at': datetime.now().isoformat()
+            'name': name,
+            'headers': [],
+            'row_count': 0,
+            'column_count': 0,
+            'uploaded_at': datetime.now().isoformat(),
+            'version': 1,
+            'status': 'processing'
         }
+        submit_upload(upload_pipeline, columnar_store, dataset_id, path,
+                      chunksize=app.config['INGEST_CHUNK_ROWS'], remove_source=True)
         
-        # Get numeric columns
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        
-        return jsonify({
-            'id': dataset_id,
-            'name': datasets[dataset_id]['name'],
-            'headers': datasets[dataset_id]['headers'],
-            'rows': df.head(50).values.tolist(),
-            'row_count': datasets[dataset_id]['row_count'],
-            'column_count': datasets[dataset_id]['column_count'],
-            'numeric_columns': numeric_cols,
-            'uploaded_at': datasets[dataset_id]['uploaded_at']
-        })
-        
+    except Exception as e:
+        columnar_store.delete(dataset_id)
+        if os.path.exists(path):
+            os.remove(path)
+        return jsonify({'error': str(e)}), 500
+    
+    response = jsonify({
+        'id': dataset_id,
+        'name': name,
+        'status': 'processing',
+        'status_url': f'/api/datasets/{dataset_id}/status',
+        'uploaded_at': datasets[dataset_id]['uploaded_at']
+    })
+    response.headers['Location'] = f'/api/datasets/{dataset_id}/status'
+    return response, 202
+
+@app.route('/api/upload/stream', methods=['POST'])
+def upload_stream():
+    """Ingest a raw CSV request body (?name=file.csv) without buffering it"""
+    name = request.args.get('name', 'upload.csv')
+    dataset_id = new_dataset_id()
+    
+    try:
+        with timed('parse'):
+            meta, preview = ingest_csv(columnar_store, dataset_id, request.stream,
+                                       chunksize=app.config['INGEST_CHUNK_ROWS'])
+        response = register_dataset(dataset_id, name, meta, preview)
+        # Profile in the background; column_stats builds it itself if asked first
+        upload_pipeline.call(refresh_profile, columnar_store.root, dataset_id, 1)
+        return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -119,25 +523,82 @@ def list_datasets():
             'headers': ds_data['headers'],
             'row_count': ds_data['row_count'],
             'column_count': ds_data['column_count'],
-            'uploaded_at': ds_data['uploaded_at']
+            'uploaded_at': ds_data['uploaded_at'],
+            'status': ds_data.get('status', 'ready')
         }
-        for ds_id, ds_data in datasets.items()
+        for ds_id, ds_data in ((ds_id, refresh_status(ds_id)) for ds_id in datasets.keys())
     ])
 
+@app.route('/api/datasets/<dataset_id>/status', methods=['GET'])
+def dataset_status(dataset_id):
+    """Upload processing stage and progress (the column profile once ready)"""
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    ds = refresh_status(dataset_id)
+    progress = columnar_store.status(dataset_id) or {}
+    profile = get_profile(dataset_id) if ds.get('status', 'ready') == 'ready' else None
+    return jsonify({
+        'id': dataset_id,
+        'name': ds['name'],
+        'status': ds.get('status', 'ready'),
+        'stage': progress.get('stage', 'ready'),
+        'progress': progress.get('progress', 1.0),
+        'rows_parsed': progress.get('rows_parsed', ds['row_count']),
+        'error': ds.get('error'),
+        'row_count': ds['row_count'],
+        'column_count': ds['column_count'],
+        'headers': ds['headers'],
+        'dtypes': progress.get('dtypes'),
+        'numeric_columns': profile['numeric_columns'] if profile else None,
+        'profile': profile['columns'] if profile else None,
+        'uploaded_at': ds['uploaded_at'],
+        'updated_at': progress.get('updated_at')
+    })
+
 @app.route('/api/datasets/<dataset_id>', methods=['GET'])
+@requires_ready
 def get_dataset(dataset_id):
-    """Get dataset by ID"""
+    """Get dataset by ID
+
+    Supports ?offset=&limit=&columns=a,b and ?format=ndjson|arrow (or the
+    matching Accept header) to stream rows instead of building one JSON
+    document, and ?format=msgpack for a compact binary response.
+    """
     if dataset_id not in datasets:
         return jsonify({'error': 'Dataset not found'}), 404
     
     ds = datasets[dataset_id]
-    df = ds['dataframe']
+    
+    try:
+        offset, limit, columns = parse_row_window(request.args, ds['headers'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    fmt = response_format(request.args, request.headers.get('Accept', ''))
+    if fmt not in ('json', 'ndjson', 'arrow', 'msgpack'):
+        return jsonify({'error': f'Unsupported format {fmt}'}), 400
+    if fmt == 'arrow' and pa is None:
+        return jsonify({'error': 'Arrow responses require pyarrow'}), 406
+    if fmt == 'msgpack' and msgpack is None:
+        return jsonify({'error': 'MessagePack responses require msgpack'}), 406
+    
+    df = get_dataframe(dataset_id, columns)
+    window = df.iloc[offset:None if limit is None else offset + limit]
+    headers = {'X-Total-Count': str(ds['row_count'])}
+    
+    if fmt == 'ndjson':
+        return Response(stream_with_context(iter_ndjson(window)), mimetype=NDJSON_MIMETYPE, headers=headers)
+    if fmt == 'arrow':
+        return Response(stream_with_context(iter_arrow_ipc(window)), mimetype=ARROW_MIMETYPE, headers=headers)
     
     return jsonify({
         'id': dataset_id,
         'name': ds['name'],
-        'headers': ds['headers'],
-        'rows': df.values.tolist(),
+        'headers': columns,
+        'rows': window.to_numpy(),
+        'offset': offset,
+        'limit': limit,
         'row_count': ds['row_count'],
         'column_count': ds['column_count']
     })
@@ -149,231 +610,547 @@ def delete_dataset(dataset_id):
         return jsonify({'error': 'Dataset not found'}), 404
     
     del datasets[dataset_id]
+    column_cache.discard(lambda key: key[0] == dataset_id)
+    result_cache.discard(lambda key: key[0] == dataset_id)
+    accumulators.discard(lambda key: key[0] == dataset_id)
+    matrix_cache.discard(lambda key: key[0] == dataset_id)
     return jsonify({'message': 'Dataset deleted successfully'})
 
+@app.route('/api/datasets/<dataset_id>/rows', methods=['PATCH'])
+@requires_ready
+def append_rows(dataset_id):
+    """Append rows to a dataset
+
+    Accepts {rows: [[...]]} in header order, {records: [{column: value}]}
+    or a text/csv body with a header row. The dataset version is bumped,
+    and tracked risk metrics and backtests are updated from the new rows
+    only instead of being recomputed over the whole history.
+    """
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    ds = datasets[dataset_id]
+    
+    try:
+        chunks = [chunk for chunk in parse_appended_rows(ds['headers']) if len(chunk)]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not chunks:
+        return jsonify({'error': 'No rows provided'}), 400
+    
+    try:
+        with datasets.lock(dataset_id):
+            ds = datasets[dataset_id]
+            writer = columnar_store.appender(dataset_id)
+            try:
+                for chunk in chunks:
+                    writer.append(chunk)
+                meta = writer.close()
+            except Exception:
+                writer.abort()
+                raise
+            
+            refreshed = refresh_incremental(dataset_id, chunks, ds['version'])
+            ds = datasets.update(dataset_id, row_count=meta['row_count'], version=ds['version'] + 1)
+        
+        upload_pipeline.call(refresh_profile, columnar_store.root, dataset_id, ds['version'])
+        
+        return jsonify({
+            'id': dataset_id,
+            'appended': sum(len(chunk) for chunk in chunks),
+            'row_count': ds['row_count'],
+            'version': ds['version'],
+            'refreshed_analyses': refreshed
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/datasets/<dataset_id>/risk-metrics', methods=['POST'])
+@requires_ready
 def risk_metrics(dataset_id):
     """Calculate risk metrics"""
     if dataset_id not in datasets:
         return jsonify({'error': 'Dataset not found'}), 404
     
+    data = request.get_json()
+    try:
+        column = parse_risk_params(data)['column']
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    invalid = column_error(dataset_id, [column])
+    if invalid is not None:
+        return invalid
+    
+    if data.get('async'):
+        return submit_job('risk_metrics', dataset_id, {'column': column}, data.get('timeout'))
+    
+    def compute():
+        version, prices = load_versioned_prices(dataset_id, column)
+        if len(prices) < 10:
+            raise ValueError('Insufficient data points')
+        track_incremental(dataset_id, version, 'risk_metrics', {'column': column},
+                          column, RiskAccumulator(prices))
+        return compute_risk_metrics(prices)
+    
+    try:
+        return memoized_response(dataset_id, 'risk_metrics', {'column': column}, compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>/risk-metrics/batch', methods=['POST'])
+@requires_ready
+def batch_risk_metrics(dataset_id):
+    """Risk metrics and correlations for many columns in one pass"""
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    columns = data.get('columns') or get_profile(dataset_id)['numeric_columns']
+    include_correlation = data.get('include_correlation', True)
+    
+    try:
+        alignment = alignment_params(data, default_join='pairwise')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    invalid = column_error(dataset_id, columns)
+    if invalid is None and alignment['date_column']:
+        invalid = column_error(dataset_id, [alignment['date_column']], numeric=False)
+    if invalid is not None:
+        return invalid
+    
+    if not columns:
+        return jsonify({'error': 'No numeric columns'}), 400
+    
+    try:
+        _, prices, returns = load_aligned(dataset_id, columns, **alignment)
+        metrics = compute_batch_risk(prices)
+        
+        result = {
+            'columns': columns,
+            'metrics': {
+                col: {name: metric[i] for name, metric in metrics.items()}
+                for i, col in enumerate(columns)
+            },
+            'insufficient': [col for i, col in enumerate(columns) if np.isnan(metrics['mean'][i])]
+        }
+        if include_correlation:
+            result['correlation'] = pairwise_correlation(returns)
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>/monte-carlo-var', methods=['POST'])
+@requires_ready
+def monte_carlo_var(dataset_id):
+    """Simulated VaR/CVaR with confidence intervals for a column or portfolio
+
+    Paths are generated in seeded batches spread over the job pool, so a
+    given seed reproduces the same result. Runs with an explicit seed
+    are memoized.
+    """
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    data = request.get_json()
+    try:
+        params = parse_var_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    columns = params['columns']
+    
+    invalid = column_error(dataset_id, columns)
+    if invalid is not None:
+        return invalid
+    
+    if data.get('async'):
+        return submit_job('monte_carlo_var', dataset_id, params, data.get('timeout'))
+    
+    def compute():
+        prices = get_dataframe(dataset_id, columns).dropna().to_numpy(dtype=float)
+        # Single-batch runs are cheaper in-process than a round trip to the pool
+        map_fn = job_manager.map if params['paths'] > DEFAULT_BATCH_PATHS else map
+        return simulate_var(prices, params['weights'], params['method'], params['horizon'],
+                            params['paths'], params['seed'], tuple(params['confidence_levels']),
+                            map_fn=map_fn)
+    
+    try:
+        if params['seed'] is None:
+            return jsonify(compute())
+        return memoized_response(dataset_id, 'monte_carlo_var', params, compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>/rolling-risk', methods=['POST'])
+@requires_ready
+def rolling_risk(dataset_id):
+    """Rolling-window volatility, Sharpe, VaR and drawdown for charting"""
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
     data = request.get_json()
     column = data.get('column')
+    date_column = data.get('date_column')
+    max_points = data.get('max_points', 500)
     
     if not column:
         return jsonify({'error': 'Column parameter required'}), 400
     
-    df = datasets[dataset_id]['dataframe']
+    invalid = column_error(dataset_id, [column]) or \
+        (column_error(dataset_id, [date_column], numeric=False) if date_column else None)
+    if invalid is not None:
+        return invalid
+    
+    try:
+        window = int(data.get('window', 63))
+        max_points = int(max_points) if max_points else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'window and max_points must be integers'}), 400
     
-    if column not in df.columns:
-        return jsonify({'error': f'Column {column} not found'}), 400
+    if window < 2:
+        return jsonify({'error': 'window must be at least 2'}), 400
     
     try:
-        # Get data
-        prices = df[column].dropna().values
+        series = load_column(dataset_id, column).dropna()
+        prices = series.to_numpy(dtype=float)
         
-        if len(prices) < 10:
-            return jsonify({'error': 'Insufficient data points'}), 400
+        if len(prices) < window + 2:
+            return jsonify({'error': 'Insufficient data points for window'}), 400
         
-        # Calculate returns
-        returns = calculate_returns(prices)
+        metrics = compute_rolling_risk(prices, window)
+        positions = series.index.to_numpy()[window:]
+        keep = downsample_indices(len(positions), max_points)
         
-        # Calculate metrics
-        mean_return = float(np.mean(returns) * 252)
-        volatility = float(np.std(returns) * np.sqrt(252))
-        sharpe_ratio = mean_return / volatility if volatility > 0 else 0
-        var_95 = float(-np.percentile(returns, 5))
-        var_99 = float(-np.percentile(returns, 1))
-        max_dd = calculate_max_drawdown(prices)
+        result = {
+            'column': column,
+            'window': window,
+            'total_points': len(positions),
+            'index': positions[keep]
+        }
+        if date_column:
+            labels = load_column(dataset_id, date_column).to_numpy()[positions[keep]]
+            result['labels'] = [str(label) for label in labels]
+        for name, values in metrics.items():
+            result[name] = values[keep]
         
-        return jsonify({
-            'mean': mean_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe_ratio,
-            'var_95': var_95,
-            'var_99': var_99,
-            'max_drawdown': max_dd
-        })
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/datasets/<dataset_id>/optimize-portfolio', methods=['POST'])
+@requires_ready
 def optimize_portfolio(dataset_id):
     """Optimize portfolio allocation"""
     if dataset_id not in datasets:
         return jsonify({'error': 'Dataset not found'}), 404
     
     data = request.get_json()
-    columns = data.get('columns', [])
-    method = data.get('method', 'equal_weight')
+    try:
+        params = parse_optimization_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    columns, method, risk_free = params['columns'], params['method'], params['risk_free_rate']
+    alignment = {name: params[name] for name in ('date_column', 'join', 'precision')}
     
-    if not columns or len(columns) < 2:
-        return jsonify({'error': 'At least 2 columns required'}), 400
+    # Validate columns
+    invalid = column_error(dataset_id, columns)
+    if invalid is None and alignment['date_column']:
+        invalid = column_error(dataset_id, [alignment['date_column']], numeric=False)
+    if invalid is not None:
+        return invalid
     
-    df = datasets[dataset_id]['dataframe']
+    if data.get('async'):
+        return submit_job('optimize_portfolio', dataset_id, params, data.get('timeout'))
     
-    # Validate columns
-    for col in columns:
-        if col not in df.columns:
-            return jsonify({'error': f'Column {col} not found'}), 400
+    def compute():
+        _, _, returns = load_aligned(dataset_id, columns, **alignment)
+        cache_key = (dataset_id, datasets[dataset_id]['version'], tuple(columns), *alignment.values())
+        return compute_portfolio(returns, columns, method, risk_free, cache_key)
     
     try:
-        # Calculate returns for each asset
-        returns_matrix = []
-        for col in columns:
-            prices = df[col].dropna().values
-            returns = calculate_returns(prices)
-            returns_matrix.append(returns)
-        
-        # Align lengths
-        min_length = min(len(r) for r in returns_matrix)
-        returns_matrix = [r[:min_length] for r in returns_matrix]
-        returns_array = np.array(returns_matrix)
-        
-        # Equal weight allocation
-        n_assets = len(columns)
-        weights = [1.0 / n_assets] * n_assets
-        
-        # Calculate portfolio metrics
-        portfolio_returns = np.dot(weights, returns_array)
-        expected_return = float(np.mean(portfolio_returns) * 252)
-        portfolio_vol = float(np.std(portfolio_returns) * np.sqrt(252))
-        sharpe = expected_return / portfolio_vol if portfolio_vol > 0 else 0
-        
-        return jsonify({
-            'weights': weights,
-            'expected_return': expected_return,
-            'volatility': portfolio_vol,
-            'sharpe_ratio': sharpe,
-            'assets': columns
-        })
-        
+        return memoized_response(dataset_id, 'optimize_portfolio', params, compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/datasets/<dataset_id>/backtest', methods=['POST'])
+@requires_ready
 def backtest_strategy(dataset_id):
     """Backtest trading strategy"""
     if dataset_id not in datasets:
         return jsonify({'error': 'Dataset not found'}), 404
     
+    data = request.get_json()
+    try:
+        params = parse_backtest_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    price_column, strategy_type = params['price_column'], params['strategy_type']
+    parameter, max_points = params['parameter'], params['max_points']
+    
+    invalid = column_error(dataset_id, [price_column])
+    if invalid is not None:
+        return invalid
+    
+    if data.get('async'):
+        return submit_job('backtest', dataset_id, params, data.get('timeout'))
+    
+    def compute():
+        version, prices = load_versioned_prices(dataset_id, price_column)
+        if len(prices) < 50:
+            raise ValueError('Insufficient data for backtesting')
+        track_incremental(dataset_id, version, 'backtest', params, price_column,
+                          BacktestAccumulator(prices, strategy_type, parameter, max_points))
+        return compute_backtest(prices, strategy_type, parameter, max_points)
+    
+    try:
+        return memoized_response(dataset_id, 'backtest', params, compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>/backtest/sweep', methods=['POST'])
+@requires_ready
+def backtest_sweep(dataset_id):
+    """Backtest a grid of strategies and windows in one pass"""
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
     data = request.get_json()
     price_column = data.get('price_column')
-    strategy_type = data.get('strategy_type', 'buyhold')
-    parameter = data.get('parameter', 20)
+    strategy_types = data.get('strategy_types', ['sma', 'momentum'])
+    rank_by = data.get('rank_by', 'sharpe_ratio')
+    limit = data.get('limit')
     
     if not price_column:
         return jsonify({'error': 'price_column required'}), 400
     
-    df = datasets[dataset_id]['dataframe']
+    invalid = column_error(dataset_id, [price_column])
+    if invalid is not None:
+        return invalid
     
-    if price_column not in df.columns:
-        return jsonify({'error': f'Column {price_column} not found'}), 400
+    for strategy_type in strategy_types:
+        if strategy_type not in STRATEGIES:
+            return jsonify({'error': f'Unknown strategy {strategy_type}'}), 400
+    
+    if rank_by not in ('total_return', 'sharpe_ratio', 'max_drawdown'):
+        return jsonify({'error': f'Cannot rank by {rank_by}'}), 400
+    
+    try:
+        windows = parse_parameter_grid(data.get('parameters', {'start': 5, 'stop': 200, 'step': 5}),
+                                       app.config['MAX_SWEEP_COMBINATIONS'] // max(1, len(strategy_types)))
+        limit = parse_limit(limit)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
-        prices = df[price_column].dropna().values
+        prices = load_prices(dataset_id, price_column)
         
         if len(prices) < 50:
             return jsonify({'error': 'Insufficient data for backtesting'}), 400
         
-        # Generate signals
-        signals = np.zeros(len(prices))
+        rows = []
+        for strategy_type in strategy_types:
+            # Buy and hold has no window, so it is evaluated once
+            grid = [windows[0]] if strategy_type == 'buyhold' else windows
+            metrics = sweep_backtests(prices, strategy_type, grid)
+            for i, window in enumerate(grid):
+                rows.append({
+                    'strategy_type': strategy_type,
+                    'parameter': None if strategy_type == 'buyhold' else window,
+                    'total_return': float(metrics['total_return'][i]),
+                    'volatility': float(metrics['volatility'][i]),
+                    'sharpe_ratio': float(metrics['sharpe_ratio'][i]),
+                    'max_drawdown': float(metrics['max_drawdown'][i]),
+                    'final_value': float(metrics['final_value'][i])
+                })
         
-        if strategy_type == "buyhold":
-            signals = np.ones(len(prices))
-        elif strategy_type == "sma":
-            sma = calculate_moving_average(prices, parameter)
-            for i in range(parameter, len(prices)):
-                signals[i] = 1 if prices[i] > sma[i - parameter] else 0
-        elif strategy_type == "momentum":
-            for i in range(parameter, len(prices)):
-                signals[i] = 1 if prices[i] > prices[i - parameter] else 0
-        
-        # Simulate trading
-        cash = 10000.0
-        position = 0.0
-        portfolio_values = []
-        
-        for i in range(len(prices)):
-            if signals[i] == 1 and position == 0:
-                position = cash / prices[i]
-                cash = 0
-            elif signals[i] == 0 and position > 0:
-                cash = position * prices[i]
-                position = 0
-            
-            portfolio_value = cash + (position * prices[i])
-            portfolio_values.append(portfolio_value)
-        
-        # Calculate metrics
-        portfolio_array = np.array(portfolio_values)
-        returns = calculate_returns(portfolio_array)
-        
-        total_return = ((portfolio_values[-1] - 10000) / 10000) * 100
-        volatility = float(np.std(returns) * np.sqrt(252))
-        sharpe = float(np.mean(returns) * 252 / volatility) if volatility > 0 else 0
-        max_dd = calculate_max_drawdown(portfolio_array)
+        # Lower drawdown is better; higher is better for the others
+        rows.sort(key=lambda row: row[rank_by], reverse=rank_by != 'max_drawdown')
+        for rank, row in enumerate(rows, start=1):
+            row['rank'] = rank
         
         return jsonify({
-            'total_return': total_return,
-            'volatility': volatility,
-            'sharpe_ratio': sharpe,
-            'max_drawdown': max_dd,
-            'portfolio_values': portfolio_values[:100],  # Return first 100 for preview
-            'final_value': portfolio_values[-1]
+            'price_column': price_column,
+            'ranked_by': rank_by,
+            'combinations': len(rows),
+            'results': rows if limit is None else rows[:limit]
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/datasets/<dataset_id>/backtest/portfolio', methods=['POST'])
+@requires_ready
+def backtest_portfolio(dataset_id):
+    """Backtest a multi-asset portfolio rebalanced on a schedule, net of costs"""
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    data = request.get_json()
+    try:
+        params = parse_portfolio_backtest_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    columns = params['columns']
+    date_column = params['date_column']
+    invalid = column_error(dataset_id, columns)
+    if invalid is None and date_column:
+        invalid = column_error(dataset_id, [date_column], numeric=False)
+    if invalid is not None:
+        return invalid
+    
+    if data.get('async'):
+        return submit_job('portfolio_backtest', dataset_id, params, data.get('timeout'))
+    
+    def compute():
+        dates, prices, _ = load_aligned(dataset_id, columns, date_column, params['join'])
+        return compute_portfolio_backtest(
+            prices, columns, params['method'], params['rebalance'], params['lookback'],
+            params['cost_bps'], params['slippage_bps'], params['weights'], dates,
+            params['reestimate'], params['risk_free_rate'], params['max_points']
+        )
+    
+    try:
+        return memoized_response(dataset_id, 'portfolio_backtest', params, compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/datasets/<dataset_id>/column-stats/<column_name>', methods=['GET'])
+@requires_ready
 def column_stats(dataset_id, column_name):
-    """Get column statistics"""
+    """Get column statistics from the precomputed profile
+
+    Numeric columns longer than profiling.EXACT_QUANTILE_ROWS report
+    sketched quantiles (approximate: true).
+    """
     if dataset_id not in datasets:
         return jsonify({'error': 'Dataset not found'}), 404
     
-    df = datasets[dataset_id]['dataframe']
-    
-    if column_name not in df.columns:
-        return jsonify({'error': f'Column {column_name} not found'}), 400
+    invalid = column_error(dataset_id, [column_name], numeric=False)
+    if invalid is not None:
+        return invalid
     
     try:
-        series = df[column_name]
-        
-        if pd.api.types.is_numeric_dtype(series):
-            return jsonify({
-                'type': 'numeric',
-                'count': int(series.count()),
-                'mean': float(series.mean()),
-                'std': float(series.std()),
-                'min': float(series.min()),
-                'max': float(series.max()),
-                'median': float(series.median()),
-                'q25': float(series.quantile(0.25)),
-                'q75': float(series.quantile(0.75))
-            })
-        else:
-            return jsonify({
-                'type': 'categorical',
-                'count': int(series.count()),
-                'unique': int(series.nunique()),
-                'top': str(series.mode()[0]) if len(series.mode()) > 0 else None,
-                'freq': int(series.value_counts().iloc[0]) if len(series) > 0 else 0
-            })
-            
+        return jsonify(get_profile(dataset_id)['columns'][column_name])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Submit an analysis to run in the background"""
+    data = request.get_json()
+    task_name = data.get('type')
+    dataset_id = data.get('dataset_id')
+    params = data.get('params', {})
+    
+    if dataset_id not in datasets:
+        return jsonify({'error': 'Dataset not found'}), 404
+    
+    not_ready = readiness_error(dataset_id)
+    if not_ready is not None:
+        return not_ready
+    
+    if task_name not in JOB_PARAMS:
+        return jsonify({'error': f'Unknown job type {task_name}'}), 400
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    
+    # The same validation as the synchronous endpoints, so bad input is a 400, not a failed job
+    try:
+        params = JOB_PARAMS[task_name](params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    invalid = column_error(dataset_id, required_columns(task_name, params))
+    if invalid is None and params.get('date_column'):
+        invalid = column_error(dataset_id, [params['date_column']], numeric=False)
+    if invalid is not None:
+        return invalid
+    
+    return submit_job(task_name, dataset_id, params, data.get('timeout'))
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List recent jobs"""
+    return jsonify([job.to_dict(include_result=False) for job in job_manager.list()])
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job's status, including its result once completed"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Return a job's result, 202 while it is still in progress
+
+    ?wait=<seconds> (capped at READY_WAIT_MAX) long-polls for the job to finish.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    try:
+        wait = parse_wait(request.args.get('wait'), app.config['READY_WAIT_MAX'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if wait:
+        with timed('wait'):
+            wait_until(job.future.done, wait)
+    
+    info = job.to_dict()
+    if info['status'] == 'completed':
+        return jsonify(info['result'])
+    if info['status'] in ('pending', 'running'):
+        return jsonify(info), 202
+    if info['status'] == 'timeout':
+        return jsonify(info), 504
+    if info['status'] == 'cancelled':
+        return jsonify(info), 410
+    return jsonify(info), 500
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a pending or running job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict(include_result=False))
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'datasets_count': len(datasets),
+        'column_cache': column_cache.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Request and stage duration histograms in Prometheus text format"""
+    return Response(render_metrics(), mimetype=PROMETHEUS_MIMETYPE)
+
 # Run the app
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
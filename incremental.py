@@ -0,0 +1,238 @@
+# Incremental analytics for Quantitative Investment Platform
+# Accumulators that fold appended rows into cached metrics
+
+import numpy as np
+
+from analytics import (calculate_returns, calculate_max_drawdown, drawdown_series, curve_width,
+                       bucket_extremes, merge_buckets, extend_buckets, curve_points)
+from backtesting import generate_signals, run_backtest, INITIAL_CAPITAL, CURVE_POINTS
+
+
+class RunningMoments:
+    """Count, mean and sum of squared deviations (Welford/Chan batch merge)"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        self.count = len(values)
+        self.mean = float(np.mean(values)) if self.count else 0.0
+        self.m2 = float(np.var(values)) * self.count if self.count else 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.count * n_b / n
+        self.count = n
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+def kth_smallest(a, b, k):
+    """k-th smallest (0-based) of the union of two sorted arrays, in O(log len(b)) steps"""
+    # i elements of b and k + 1 - i of a are the k + 1 smallest
+    lo, hi = max(0, k + 1 - len(a)), min(k + 1, len(b))
+    while lo < hi:
+        i = (lo + hi) // 2
+        if b[i] < a[k - i]:
+            lo = i + 1
+        else:
+            hi = i
+    j = k + 1 - lo
+    return max(a[j - 1] if j > 0 else -np.inf, b[lo - 1] if lo > 0 else -np.inf)
+
+
+class SortedSample:
+    """Every value added so far, for exact np.percentile results
+
+    New values are merged into a small sorted tail; the tail is merged
+    into the main sorted array once it outgrows sqrt(main size x batch
+    size), which balances the two merges. An append of b values then
+    costs O(b log b + sqrt(n b)) amortized instead of an O(n) insert.
+    """
+
+    def __init__(self, values):
+        self.main = np.sort(np.asarray(values, dtype=float))
+        self.tail = np.empty(0)
+
+    def __len__(self):
+        return len(self.main) + len(self.tail)
+
+    @property
+    def nbytes(self):
+        return self.main.nbytes + self.tail.nbytes
+
+    def add(self, values):
+        values = np.sort(np.asarray(values, dtype=float))
+        self.tail = np.insert(self.tail, np.searchsorted(self.tail, values), values)
+        if len(self.tail) ** 2 > len(self.main) * len(values):
+            self.main = np.insert(self.main, np.searchsorted(self.main, self.tail), self.tail)
+            self.tail = np.empty(0)
+
+    def percentile(self, q):
+        """np.percentile with linear interpolation"""
+        position = (len(self) - 1) * q / 100.0
+        lower = int(np.floor(position))
+        low = kth_smallest(self.main, self.tail, lower)
+        high = kth_smallest(self.main, self.tail, min(lower + 1, len(self) - 1))
+        return low + (position - lower) * (high - low)
+
+
+class RiskAccumulator:
+    """Running state behind compute_risk_metrics for one price column
+
+    Mean and volatility use merged moments and drawdown a running peak,
+    so an update costs O(new rows). VaR stays exact: returns are kept
+    in a SortedSample.
+    """
+
+    def __init__(self, prices):
+        returns = calculate_returns(prices)
+        self.moments = RunningMoments(returns)
+        self.returns = SortedSample(returns)
+        self.last_price = float(prices[-1])
+        self.peak = float(np.max(prices))
+        self.max_drawdown = calculate_max_drawdown(prices)
+
+    def update(self, new_prices):
+        new_prices = np.asarray(new_prices, dtype=float)
+        if len(new_prices) == 0:
+            return
+        returns = calculate_returns(np.concatenate(([self.last_price], new_prices)))
+        self.moments.update(returns)
+
+        self.returns.add(returns)
+
+        peaks = np.maximum.accumulate(np.concatenate(([self.peak], new_prices)))[1:]
+        self.max_drawdown = max(self.max_drawdown, float(np.max((peaks - new_prices) / peaks)))
+        self.peak = float(peaks[-1])
+        self.last_price = float(new_prices[-1])
+
+    def result(self):
+        mean_return = float(self.moments.mean * 252)
+        volatility = float(self.moments.std * np.sqrt(252))
+        return {
+            'mean': mean_return,
+            'volatility': volatility,
+            'sharpe_ratio': mean_return / volatility if volatility > 0 else 0,
+            'var_95': float(-self.returns.percentile(5)),
+            'var_99': float(-self.returns.percentile(1)),
+            'max_drawdown': self.max_drawdown
+        }
+
+    @property
+    def nbytes(self):
+        return self.returns.nbytes
+
+
+class CurveSummary:
+    """Min/max buckets of a growing curve, matching analytics.downsample_curve
+
+    Bucket edges are fixed multiples of a power-of-two width, so new
+    points only touch the last bucket and a longer curve merges
+    neighbouring pairs. Memory is O(max_points) however long the curve.
+    """
+
+    def __init__(self, values, max_points=CURVE_POINTS):
+        values = np.asarray(values, dtype=float)
+        self.max_points = max_points
+        self.count = len(values)
+        self.width = curve_width(self.count, max_points)
+        self.buckets = bucket_extremes(values, self.width)
+        self.first = float(values[0])
+        self.last = float(values[-1])
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        # Coarsen first so the new points are bucketed only once
+        width = curve_width(self.count + len(values), self.max_points)
+        while self.width < width:
+            self.buckets = merge_buckets(self.buckets)
+            self.width *= 2
+        self.buckets = extend_buckets(self.buckets, bucket_extremes(values, self.width, self.count))
+        self.count += len(values)
+        self.last = float(values[-1])
+
+    def result(self):
+        return curve_points(self.buckets, (0, self.first), (self.count - 1, self.last))
+
+    @property
+    def nbytes(self):
+        return sum(np.asarray(part).nbytes for part in self.buckets)
+
+
+class BacktestAccumulator:
+    """Running state behind compute_backtest for one strategy
+
+    Keeps the latest equity, the open/flat state, the last `parameter`
+    prices the signal rules look back over, running moments and
+    drawdown of the equity curve, and min/max summaries of the equity
+    and drawdown curves.
+    """
+
+    def __init__(self, prices, strategy_type, parameter, max_points=CURVE_POINTS):
+        prices = np.asarray(prices, dtype=float)
+        self.strategy_type = strategy_type
+        self.parameter = parameter
+        equity = run_backtest(prices, strategy_type, parameter)
+        signals = generate_signals(prices, strategy_type, parameter)
+        drawdown = drawdown_series(equity)
+
+        self.moments = RunningMoments(calculate_returns(equity))
+        self.equity = float(equity[-1])
+        self.peak = float(np.max(equity))
+        self.max_drawdown = float(np.max(drawdown))
+        self.last_signal = signals[-1]
+        self.tail = prices[-parameter:].copy()
+        self.equity_curve = CurveSummary(equity, max_points)
+        self.drawdown_curve = CurveSummary(drawdown, max_points)
+
+    def update(self, new_prices):
+        new_prices = np.asarray(new_prices, dtype=float)
+        if len(new_prices) == 0:
+            return
+        extended = np.concatenate((self.tail, new_prices))
+        signals = generate_signals(extended, self.strategy_type, self.parameter)[len(self.tail):]
+
+        previous = extended[len(self.tail) - 1:-1]
+        held = np.concatenate(([self.last_signal], signals[:-1])) == 1
+        growth = np.where(held, new_prices / previous, 1.0)
+        equity = self.equity * np.cumprod(growth)
+
+        curve = np.concatenate(([self.equity], equity))
+        self.moments.update(calculate_returns(curve))
+        peaks = np.maximum.accumulate(np.concatenate(([self.peak], equity)))[1:]
+        drawdown = (peaks - equity) / peaks
+        self.max_drawdown = max(self.max_drawdown, float(np.max(drawdown)))
+        self.peak = float(peaks[-1])
+
+        self.equity_curve.update(equity)
+        self.drawdown_curve.update(drawdown)
+        self.equity = float(equity[-1])
+        self.last_signal = signals[-1]
+        self.tail = extended[-self.parameter:].copy()
+
+    def result(self):
+        volatility = float(self.moments.std * np.sqrt(252))
+        return {
+            'total_return': float((self.equity - INITIAL_CAPITAL) / INITIAL_CAPITAL * 100),
+            'volatility': volatility,
+            'sharpe_ratio': float(self.moments.mean * 252 / volatility) if volatility > 0 else 0,
+            'max_drawdown': self.max_drawdown,
+            'equity_curve': self.equity_curve.result(),
+            'drawdown_curve': self.drawdown_curve.result(),
+            'final_value': self.equity
+        }
+
+    @property
+    def nbytes(self):
+        return self.tail.nbytes + self.equity_curve.nbytes + self.drawdown_curve.nbytes
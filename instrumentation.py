@@ -0,0 +1,134 @@
+# Request instrumentation for Quantitative Investment Platform
+# Stage timings, Server-Timing headers, Prometheus histograms and cProfile
+
+import contextvars
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; Prometheus client defaults extended for long analyses
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage durations of the request running in the current context, or None
+_stages = contextvars.ContextVar('stages', default=None)
+
+
+@contextmanager
+def timed(stage):
+    """Add the duration of a block to the current request's stage timings
+
+    Costs two perf_counter calls inside a request and nothing outside
+    one, so the analytics helpers can be instrumented unconditionally
+    (job workers never start a request).
+    """
+    stages = _stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+class RequestTimer:
+    """Collects stage timings for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self._token = _stages.set(self.stages)
+
+    def finish(self):
+        """Stop collecting; returns the total duration in seconds"""
+        _stages.reset(self._token)
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total):
+        """Server-Timing header value (durations in milliseconds)"""
+        entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items()]
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in Prometheus text format"""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                base = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+                sep = ',' if base else ''
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{base}}} {total}')
+                lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Per process; under several workers each one reports its own series
+request_seconds = Histogram('quant_request_seconds', 'Request duration in seconds',
+                            ('endpoint', 'method', 'status'))
+stage_seconds = Histogram('quant_stage_seconds', 'Time spent per request stage in seconds',
+                          ('endpoint', 'stage'))
+
+
+def observe_request(endpoint, method, status, total, stages):
+    request_seconds.observe(total, endpoint, method, str(status))
+    for stage, seconds in stages.items():
+        stage_seconds.observe(seconds, endpoint, stage)
+
+
+def render_metrics():
+    """All histograms in Prometheus text exposition format"""
+    return '\n'.join(request_seconds.render() + stage_seconds.render()) + '\n'
+
+
+def start_profiler():
+    """Start a cProfile profiler, or return None if another one is active"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def profile_summary(profiler, limit=40):
+    """Stop the profiler and format its top functions by cumulative time"""
+    profiler.disable()
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
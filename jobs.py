@@ -0,0 +1,275 @@
+# Background jobs for Quantitative Investment Platform
+# Runs CPU-heavy analytics in a bounded process pool
+
+import signal
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import analytics
+import simulation
+from alignment import aligned_matrix
+from backtesting import CURVE_POINTS
+from storage import ColumnarStore
+
+
+class JobTimeout(Exception):
+    """Raised inside a worker when a job exceeds its time limit"""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+
+# Worker side
+#
+# Only the columnar store path, dataset id and column names are sent to
+# the worker. Each worker memory-maps the columns it needs, so the
+# dataset is shared through the OS page cache instead of being pickled
+# for every job.
+
+def load_prices(source, column):
+    store_root, dataset_id = source
+    return ColumnarStore(store_root).read_column(dataset_id, column).dropna().to_numpy(dtype=float)
+
+def risk_metrics_task(source, params):
+    prices = load_prices(source, params['column'])
+    if len(prices) < 10:
+        raise ValueError('Insufficient data points')
+    return analytics.compute_risk_metrics(prices)
+
+def load_aligned(source, params):
+    store_root, dataset_id = source
+    columns = list(params['columns'])
+    date_column = params.get('date_column')
+    return aligned_matrix(
+        lambda: ColumnarStore(store_root).read(dataset_id, columns + ([date_column] if date_column else [])),
+        columns, date_column, params.get('join', 'inner'), params.get('precision', 'float64')
+    )
+
+def optimize_portfolio_task(source, params):
+    _, _, returns = load_aligned(source, params)
+    return analytics.compute_portfolio(returns, params['columns'], params.get('method', 'equal_weight'),
+                                       float(params.get('risk_free_rate', 0.0)))
+
+def backtest_task(source, params):
+    prices = load_prices(source, params['price_column'])
+    if len(prices) < 50:
+        raise ValueError('Insufficient data for backtesting')
+    return analytics.compute_backtest(prices, params.get('strategy_type', 'buyhold'), int(params.get('parameter', 20)),
+                                      int(params.get('max_points', CURVE_POINTS)))
+
+def load_price_matrix(source, columns):
+    store_root, dataset_id = source
+    frame = ColumnarStore(store_root).read(dataset_id, columns)[columns]
+    return frame.dropna().to_numpy(dtype=float)
+
+def monte_carlo_var_task(source, params):
+    return simulation.simulate_var(
+        load_price_matrix(source, params['columns']),
+        params.get('weights'),
+        params.get('method', 'parametric'),
+        int(params.get('horizon', 1)),
+        int(params.get('paths', 100_000)),
+        params.get('seed'),
+        tuple(params.get('confidence_levels', (0.95, 0.99)))
+    )
+
+def portfolio_backtest_task(source, params):
+    dates, prices, _ = load_aligned(source, params)
+    return analytics.compute_portfolio_backtest(
+        prices, params['columns'], params.get('method', 'equal_weight'), params.get('rebalance', 'monthly'),
+        int(params.get('lookback', 252)), float(params.get('cost_bps', 0.0)),
+        float(params.get('slippage_bps', 0.0)), params.get('weights'), dates,
+        params.get('reestimate'), float(params.get('risk_free_rate', 0.0)),
+        int(params.get('max_points', CURVE_POINTS))
+    )
+
+TASKS = {
+    'risk_metrics': risk_metrics_task,
+    'optimize_portfolio': optimize_portfolio_task,
+    'backtest': backtest_task,
+    'monte_carlo_var': monte_carlo_var_task,
+    'portfolio_backtest': portfolio_backtest_task,
+}
+
+def required_columns(task_name, params):
+    """Columns a job will read, for validation before submitting"""
+    if task_name == 'risk_metrics':
+        return [params.get('column')]
+    if task_name in ('optimize_portfolio', 'monte_carlo_var', 'portfolio_backtest'):
+        return list(params.get('columns', []))
+    if task_name == 'backtest':
+        return [params.get('price_column')]
+    return []
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout('Job exceeded its time limit')
+
+def run_task(task_name, source, params, timeout):
+    """Worker entry point; enforces the timeout with SIGALRM where available"""
+    use_alarm = bool(timeout) and hasattr(signal, 'setitimer')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return TASKS[task_name](source, params)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# Server side
+
+def parse_timeout(value, maximum):
+    """Seconds a job may run: a positive number capped at maximum (maximum when absent)"""
+    if value in (None, ''):
+        return maximum
+    if isinstance(value, bool):
+        raise ValueError('timeout must be a positive number of seconds')
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('timeout must be a positive number of seconds')
+    if not seconds > 0:
+        raise ValueError('timeout must be a positive number of seconds')
+    return min(seconds, maximum)
+
+
+class Job:
+    """A submitted analysis and the future tracking its result"""
+
+    def __init__(self, task_name, params, timeout):
+        self.id = f"job_{uuid.uuid4().hex}"
+        self.task_name = task_name
+        self.params = params
+        self.timeout = timeout
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.future = None
+
+    @property
+    def status(self):
+        if self.cancelled:
+            return 'cancelled'
+        if not self.future.done():
+            return 'running' if self.future.running() else 'pending'
+        error = self.future.exception()
+        if error is None:
+            return 'completed'
+        return 'timeout' if isinstance(error, JobTimeout) else 'failed'
+
+    def to_dict(self, include_result=True):
+        status = self.status
+        info = {
+            'id': self.id,
+            'type': self.task_name,
+            'status': status,
+            'params': self.params,
+            'timeout': self.timeout,
+            'submitted_at': datetime.fromtimestamp(self.submitted_at).isoformat(),
+            'finished_at': datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None
+        }
+        if status == 'completed' and include_result:
+            info['result'] = self.future.result()
+        elif status in ('failed', 'timeout'):
+            info['error'] = str(self.future.exception())
+        return info
+
+
+class JobManager:
+    """Submit, poll and cancel analytics jobs on a bounded process pool"""
+
+    def __init__(self, max_workers=None, max_pending=100, default_timeout=300, retain=1000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.default_timeout = default_timeout
+        self.retain = retain
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so each server process forks its own pool
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, task_name, source, params, timeout=None):
+        """Queue a job and return it immediately"""
+        if task_name not in TASKS:
+            raise ValueError(f'Unknown job type {task_name}')
+        # A client may shorten the time limit but never extend it
+        job = Job(task_name, params, min(timeout or self.default_timeout, self.default_timeout))
+
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if not j.future.done())
+            if active >= self.max_pending:
+                raise JobQueueFull('Too many jobs in progress')
+            try:
+                job.future = self._get_executor().submit(run_task, task_name, source, params, job.timeout)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool
+                self._executor = None
+                job.future = self._get_executor().submit(run_task, task_name, source, params, job.timeout)
+            self._jobs[job.id] = job
+            self._prune()
+
+        job.future.add_done_callback(lambda f: setattr(job, 'finished_at', time.time()))
+        return job
+
+    def call(self, fn, *args):
+        """Run fn(*args) on the pool without a Job record, returning its Future"""
+        with self._lock:
+            try:
+                return self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                self._executor = None
+                return self._get_executor().submit(fn, *args)
+
+    def map(self, fn, *iterables):
+        """Run fn over the pool (e.g. simulation batches), returning results in order"""
+        with self._lock:
+            executor = self._get_executor()
+        try:
+            return list(executor.map(fn, *iterables))
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; a job already running finishes but its result is discarded"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.future.done():
+            job.future.cancel()
+            job.cancelled = True
+            job.finished_at = time.time()
+        return job
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[:max(0, len(self._jobs) - self.retain)]:
+            del self._jobs[job_id]
@@ -0,0 +1,259 @@
+# Load test for Quantitative Investment Platform
+# Short-request throughput and latency while hundreds of slow connections stay open
+#
+# Usage:
+#   python flask_backend.py                        # the WSGI server, port 5000
+#   python loadtest.py --url http://127.0.0.1:5000 --open 300 --output wsgi.json
+#   uvicorn asgi_app:app --port 8000               # the ASGI server
+#   python loadtest.py --url http://127.0.0.1:8000 --open 300 --output asgi.json --compare wsgi.json
+#
+# Open connections are slow NDJSON readers (--mode stream) or slow
+# uploaders (--mode upload); meanwhile --concurrency clients send short
+# requests as fast as they are answered for --duration seconds.
+
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from benchmark import synthetic_panel, environment
+
+# Short requests cycled by each client; {dataset} is the uploaded dataset's path
+SHORT_REQUESTS = [
+    ('GET', '/api/health', None),
+    ('GET', '{dataset}?limit=100', None),
+    ('POST', '{dataset}/risk-metrics', {'column': 'c0'}),
+]
+
+
+def request_head(method, host, path, headers=None):
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {host}', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def connect(host, port, receive_buffer=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if receive_buffer:
+        # Small so the server, not the kernel, holds what a slow reader has not read
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (host, port))
+    return await asyncio.open_connection(sock=sock)
+
+
+async def read_response(reader):
+    """(status, body) of an HTTP/1.1 response on a Connection: close socket"""
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).strip()
+        if not line:
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        return status, await reader.readexactly(int(headers['content-length']))
+    if headers.get('transfer-encoding') == 'chunked':
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                return status, bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readline()
+    return status, await reader.read()
+
+
+async def fetch(target, method, path, payload=None, body=None, content_type=None):
+    host, port = target
+    if payload is not None:
+        body, content_type = json.dumps(payload).encode(), 'application/json'
+    headers = {'Content-Length': len(body)} if body is not None else {}
+    if content_type:
+        headers['Content-Type'] = content_type
+    reader, writer = await connect(host, port)
+    try:
+        writer.write(request_head(method, f'{host}:{port}', path, headers) + (body or b''))
+        await writer.drain()
+        return await read_response(reader)
+    finally:
+        writer.close()
+
+
+async def setup(target, rows, columns):
+    """Upload a synthetic price panel and return its dataset path"""
+    names = [f'c{i}' for i in range(columns)]
+    csv = pd.DataFrame(synthetic_panel(rows, columns), columns=names).to_csv(index=False).encode()
+    status, body = await fetch(target, 'POST', '/api/upload/stream?name=loadtest.csv',
+                               body=csv, content_type='text/csv')
+    if status != 200:
+        raise RuntimeError(f'Upload failed ({status}): {body[:200]!r}')
+    return f"/api/datasets/{json.loads(body)['id']}", csv
+
+
+async def slow_reader(target, dataset, read_bytes, alive):
+    """Stream the dataset as NDJSON, reading read_bytes a second"""
+    host, port = target
+    reader, writer = await connect(host, port, receive_buffer=16 * 1024)
+    try:
+        writer.write(request_head('GET', f'{host}:{port}', f'{dataset}?format=ndjson'))
+        await writer.drain()
+        while await reader.read(read_bytes):
+            alive.add(writer)
+            await asyncio.sleep(1)
+    finally:
+        alive.discard(writer)
+        writer.close()
+
+
+async def slow_uploader(target, csv, read_bytes, alive):
+    """Upload the dataset's CSV, sending read_bytes a second"""
+    host, port = target
+    reader, writer = await connect(host, port)
+    try:
+        headers = {'Content-Length': len(csv), 'Content-Type': 'text/csv'}
+        writer.write(request_head('POST', f'{host}:{port}', '/api/upload/stream?name=slow.csv', headers))
+        for start in range(0, len(csv), read_bytes):
+            writer.write(csv[start:start + read_bytes])
+            await writer.drain()
+            alive.add(writer)
+            await asyncio.sleep(1)
+        await read_response(reader)
+    finally:
+        alive.discard(writer)
+        writer.close()
+
+
+async def short_client(target, dataset, deadline, latencies, errors, timeout):
+    i = 0
+    while time.monotonic() < deadline:
+        method, path, payload = SHORT_REQUESTS[i % len(SHORT_REQUESTS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(fetch(target, method, path.format(dataset=dataset), payload), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append('connection')
+            continue
+        if status != 200:
+            errors.append(status)
+        else:
+            latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(url, open_connections, mode, concurrency, duration, rows, columns, read_bytes, ramp, timeout):
+    parts = urlsplit(url)
+    target = (parts.hostname, parts.port or 80)
+    dataset, csv = await setup(target, rows, columns)
+
+    alive = set()
+    if mode == 'stream':
+        holders = [asyncio.ensure_future(slow_reader(target, dataset, read_bytes, alive))
+                   for _ in range(open_connections)]
+    else:
+        holders = [asyncio.ensure_future(slow_uploader(target, csv, read_bytes, alive))
+                   for _ in range(open_connections)]
+
+    # Let the open connections be accepted (or queue) before measuring
+    ramp_deadline = time.monotonic() + ramp
+    while len(alive) < open_connections and time.monotonic() < ramp_deadline:
+        await asyncio.sleep(0.1)
+    opened = len(alive)
+
+    latencies, errors = [], []
+    start = time.monotonic()
+    await asyncio.gather(*(short_client(target, dataset, start + duration, latencies, errors, timeout)
+                           for _ in range(concurrency)))
+    elapsed = time.monotonic() - start
+    still_open = len(alive)
+
+    for holder in holders:
+        holder.cancel()
+    await asyncio.gather(*holders, return_exceptions=True)
+    await fetch(target, 'DELETE', dataset)
+
+    return {
+        'url': url,
+        'mode': mode,
+        'open_connections': open_connections,
+        'opened': opened,
+        'still_open': still_open,
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else float('nan'),
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else float('nan')
+    }
+
+
+def report(result, file=sys.stderr):
+    print(f"{result['url']}  {result['mode']}: {result['opened']}/{result['open_connections']} open "
+          f"({result['still_open']} still open), {result['concurrency']} short clients", file=file)
+    print(f"  {result['requests']} requests, {result['errors']} errors, "
+          f"{result['requests_per_second']:.1f} req/s", file=file)
+    print(f"  latency p50 {result['p50_ms']:.1f} ms  p95 {result['p95_ms']:.1f} ms  "
+          f"p99 {result['p99_ms']:.1f} ms  max {result['max_ms']:.1f} ms", file=file)
+
+
+def compare(result, baseline):
+    """Print throughput and latency ratios (new / baseline)"""
+    for key in ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms'):
+        old = baseline[key]
+        ratio = result[key] / old if old else float('nan')
+        print(f"  {key:20} {old:10.1f} -> {result[key]:10.1f}  ({ratio:.2f}x)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the API with many open connections')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--open', type=int, default=300, help='slow connections held open')
+    parser.add_argument('--mode', choices=('stream', 'upload'), default='stream',
+                        help='open connections read NDJSON slowly or upload slowly')
+    parser.add_argument('--concurrency', type=int, default=20, help='clients sending short requests')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of short requests')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--read-bytes', type=int, default=1024, help='bytes a slow connection moves a second')
+    parser.add_argument('--ramp', type=float, default=10, help='seconds to wait for the open connections')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a short request fails')
+    parser.add_argument('--output', help='write JSON results here (default stdout)')
+    parser.add_argument('--compare', help='baseline JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.url, args.open, args.mode, args.concurrency, args.duration,
+                             args.rows, args.columns, args.read_bytes, args.ramp, args.timeout))
+    report(result)
+    text = json.dumps({'environment': environment(), 'results': result}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+# Portfolio optimization for Quantitative Investment Platform
+# Long-only mean-variance solvers vectorized with NumPy
+
+import numpy as np
+
+try:
+    from scipy.linalg import cho_factor, cho_solve
+except ImportError:  # Falls back to an LU solve per right-hand side
+    cho_factor = cho_solve = None
+
+from alignment import alignment_params
+from caching import LRUCache
+
+METHODS = ('equal_weight', 'min_variance', 'max_sharpe', 'risk_parity', 'efficient_frontier')
+
+# Names used by the frontend (app.js) and the README
+METHOD_ALIASES = {
+    'equalWeight': 'equal_weight',
+    'minVolatility': 'min_variance',
+    'min_volatility': 'min_variance',
+    'minVariance': 'min_variance',
+    'maxSharpe': 'max_sharpe',
+    'riskParity': 'risk_parity',
+    'efficientFrontier': 'efficient_frontier',
+}
+
+# Annualized moments per (dataset version, column set)
+moments_cache = LRUCache(64 * 1024 * 1024, sizeof=lambda m: m[0].nbytes + m[1].nbytes)
+
+
+def normalize_method(method):
+    method = METHOD_ALIASES.get(method, method)
+    if method not in METHODS:
+        raise ValueError(f'Unknown optimization method {method}')
+    return method
+
+
+def parse_optimization_params(data):
+    """Validated optimization settings from a request body
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    columns = list(data.get('columns') or [])
+    if len(columns) < 2:
+        raise ValueError('At least 2 columns required')
+    try:
+        risk_free = float(data.get('risk_free_rate', 0.0))
+    except (TypeError, ValueError):
+        raise ValueError('risk_free_rate must be numeric')
+    return {
+        'columns': columns,
+        'method': normalize_method(data.get('method', 'equal_weight')),
+        'risk_free_rate': risk_free,
+        **alignment_params(data, joins=('inner', 'outer'))
+    }
+
+
+def portfolio_moments(returns_array, cache_key=None):
+    """Annualized mean vector and covariance of an (assets x periods) returns array
+
+    The covariance uses ddof=0 so portfolio volatility matches
+    np.std of the portfolio return series.
+    """
+    if cache_key is not None:
+        cached = moments_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    returns_array = np.asarray(returns_array, dtype=float)
+    mu = returns_array.mean(axis=1) * 252
+    centered = returns_array - returns_array.mean(axis=1, keepdims=True)
+    cov = centered @ centered.T / returns_array.shape[1] * 252
+
+    if cache_key is not None:
+        moments_cache.put(cache_key, (mu, cov))
+    return mu, cov
+
+
+def solve_qp(Q, c, A, b, max_iter=100, tol=1e-9):
+    """Minimize ½ x'Qx + c'x subject to Ax = b and x >= 0
+
+    Mehrotra predictor-corrector interior point method. A has only one
+    or two rows here (budget, target return), so each Newton step
+    reduces to one factorization of the n x n reduced system plus a
+    tiny Schur complement.
+    """
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    b = np.atleast_1d(np.asarray(b, dtype=float))
+    n = len(c)
+    x = np.full(n, 1.0 / n)
+    s = np.ones(n)
+    lam = np.zeros(len(b))
+    scale = 1.0 + max(np.abs(Q).max(), np.abs(c).max())
+
+    for _ in range(max_iter):
+        r_dual = Q @ x + c - A.T @ lam - s
+        r_primal = A @ x - b
+        mu = x @ s / n
+        if mu < tol and np.abs(r_dual).max() < tol * scale and np.abs(r_primal).max() < tol:
+            break
+
+        solve = _factorize(Q + np.diag(s / x))
+        v, u_aff = np.hsplit(solve(np.column_stack((A.T, -r_dual - s))), [len(b)])
+        u_aff = u_aff[:, 0]
+        schur = A @ v
+
+        def newton_step(u, r_comp):
+            d_lam = np.linalg.solve(schur, -r_primal - A @ u)
+            dx = u + v @ d_lam
+            ds = (r_comp - s * dx) / x
+            return dx, ds, d_lam
+
+        # Predictor (affine scaling) step
+        dx, ds, d_lam = newton_step(u_aff, -x * s)
+        alpha_p = _step_length(x, dx)
+        alpha_d = _step_length(s, ds)
+        mu_aff = (x + alpha_p * dx) @ (s + alpha_d * ds) / n
+        sigma = (mu_aff / mu) ** 3
+
+        # Corrector step with centering; only the change in r_comp needs a new solve
+        correction = -dx * ds + sigma * mu
+        dx, ds, d_lam = newton_step(u_aff + solve(correction / x), -x * s + correction)
+        alpha_p = min(1.0, 0.99 * _step_length(x, dx))
+        alpha_d = min(1.0, 0.99 * _step_length(s, ds))
+        x = x + alpha_p * dx
+        s = s + alpha_d * ds
+        lam = lam + alpha_d * d_lam
+
+    return np.maximum(x, 0.0)
+
+
+def _factorize(M):
+    """Solver for M y = rhs with M symmetric positive definite"""
+    if cho_factor is not None:
+        factor = cho_factor(M, check_finite=False)
+        return lambda rhs: cho_solve(factor, rhs, check_finite=False)
+    return lambda rhs: np.linalg.solve(M, rhs)
+
+
+def active_set_qp(Q, c, A, b, support, max_iter=50, tol=1e-10):
+    """Minimize ½ x'Qx + c'x subject to Ax = b and x >= 0, starting from a guessed support
+
+    Solves the equality-constrained problem on the support and then
+    drops the most negative weight or adds the asset whose gradient
+    most violates optimality, one at a time. Starting from a nearby
+    solution's support this takes a few k x k solves (k assets held)
+    instead of an interior point solve over all n. Returns None when
+    it does not settle, so callers can fall back to solve_qp.
+    """
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    b = np.atleast_1d(np.asarray(b, dtype=float))
+    held = np.asarray(support, dtype=bool).copy()
+    m = len(b)
+    scale = tol * (1.0 + max(np.abs(Q).max(), np.abs(c).max()))
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(held)
+        k = len(idx)
+        kkt = np.zeros((k + m, k + m))
+        kkt[:k, :k] = Q[np.ix_(idx, idx)]
+        kkt[:k, k:] = -A[:, idx].T
+        kkt[k:, :k] = A[:, idx]
+        try:
+            solution = np.linalg.solve(kkt, np.concatenate((-c[idx], b)))
+        except np.linalg.LinAlgError:
+            return None
+        x_held, lam = solution[:k], solution[k:]
+        if x_held.min() < -tol:
+            held[idx[x_held < -tol]] = False
+            continue
+        gradient = Q[:, idx] @ x_held + c - A.T @ lam
+        gradient[idx] = 0.0
+        violated = gradient < -scale
+        if not violated.any():
+            x = np.zeros(len(c))
+            x[idx] = np.maximum(x_held, 0.0)
+            return x
+        held |= violated
+    return None
+
+
+def _step_length(values, direction):
+    """Largest step in [0, 1] keeping values + step * direction >= 0"""
+    negative = direction < 0
+    if not np.any(negative):
+        return 1.0
+    return min(1.0, float(np.min(-values[negative] / direction[negative])))
+
+
+def _fully_invested(weights):
+    # Interior point solutions approach zero but never reach it
+    weights = np.where(weights < 1e-9 * weights.max(), 0.0, weights)
+    return weights / weights.sum()
+
+
+def mean_variance_weights(mu, cov, gamma):
+    """Long-only weights minimizing w'Σw - γ μ'w"""
+    n = len(mu)
+    return _fully_invested(solve_qp(2.0 * cov, -gamma * mu, np.ones(n), 1.0))
+
+
+def min_variance_weights(cov):
+    return mean_variance_weights(np.zeros(len(cov)), cov, 0.0)
+
+
+def risk_parity_weights(cov, max_iter=100, tol=1e-10):
+    """Equal risk contribution weights via Newton's method
+
+    Minimizes ½ y'Σy - Σ log(y_i)/n over y > 0; at the optimum every
+    asset contributes the same share of variance once y is normalized.
+    """
+    n = len(cov)
+    budget = np.full(n, 1.0 / n)
+    y = 1.0 / np.sqrt(np.diag(cov))
+    y /= np.sqrt(y @ cov @ y)
+    for _ in range(max_iter):
+        grad = cov @ y - budget / y
+        hess = cov + np.diag(budget / y ** 2)
+        delta = np.linalg.solve(hess, grad)
+        # Backtrack to stay inside the positive orthant
+        step = 1.0
+        while np.any(y - step * delta <= 0):
+            step *= 0.5
+        y = y - step * delta
+        if np.max(np.abs(step * delta)) < tol:
+            break
+    return y / y.sum()
+
+
+def efficient_frontier(mu, cov, points=20):
+    """Long-only frontier from minimum variance up to the best-returning asset
+
+    Each point minimizes w'Σw for a target return, with budget and
+    target stacked as the two equality constraints. Only the minimum
+    variance corner needs an interior point solve: the top corner holds
+    the best-returning assets alone, and each point in between is
+    warm-started from the previous point's holdings.
+    """
+    n = len(mu)
+    Q, c = 2.0 * cov, np.zeros(n)
+    w_min = min_variance_weights(cov)
+    targets = np.linspace(w_min @ mu, mu.max(), points)
+    A = np.vstack((np.ones(n), mu))
+
+    weights = np.empty((points, n))
+    weights[0] = w_min
+    for i, target in enumerate(targets[1:-1], start=1):
+        w = active_set_qp(Q, c, A, [1.0, target], weights[i - 1] > 0)
+        if w is None:
+            w = solve_qp(Q, c, A, [1.0, target])
+        weights[i] = _fully_invested(w)
+    if points > 1:
+        weights[-1] = _top_corner(mu, cov)
+
+    returns = weights @ mu
+    vols = np.sqrt(np.einsum('ij,jk,ik->i', weights, cov, weights))
+    return weights, returns, vols
+
+
+def _top_corner(mu, cov):
+    """Least-variance mix of the assets sharing the highest expected return"""
+    best = np.flatnonzero(mu >= mu.max())
+    weights = np.zeros(len(mu))
+    weights[best] = min_variance_weights(cov[np.ix_(best, best)]) if len(best) > 1 else 1.0
+    return weights
+
+
+def max_sharpe_weights(mu, cov, risk_free=0.0):
+    """Tangency portfolio
+
+    Solved exactly as min y'Σy subject to (μ - rf)'y = 1, y >= 0 and
+    rescaled to w = y / Σy.
+    """
+    n = len(mu)
+    y = solve_qp(2.0 * cov, np.zeros(n), mu - risk_free, 1.0)
+    return _fully_invested(y)
+
+
+def sharpe_ratios(weights, mu, cov, risk_free=0.0):
+    vols = np.sqrt(np.einsum('ij,jk,ik->i', weights, cov, weights))
+    excess = weights @ mu - risk_free
+    return np.divide(excess, vols, out=np.zeros_like(excess), where=vols > 0)
+
+
+def optimize_weights(mu, cov, method, risk_free=0.0):
+    """Weights for one of the single-portfolio methods"""
+    n = len(mu)
+    if method == 'equal_weight':
+        return np.full(n, 1.0 / n)
+    if method == 'min_variance':
+        return min_variance_weights(cov)
+    if method == 'max_sharpe':
+        if np.all(mu <= risk_free):
+            # No asset beats the risk-free rate; fall back to least risk
+            return min_variance_weights(cov)
+        return max_sharpe_weights(mu, cov, risk_free)
+    if method == 'risk_parity':
+        return risk_parity_weights(cov)
+    raise ValueError(f'Unknown optimization method {method}')
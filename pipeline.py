@@ -0,0 +1,142 @@
+# Upload pipeline for Quantitative Investment Platform
+# Parses, converts and profiles uploaded files in a background process
+
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from profiling import build_profile
+from storage import ColumnarStore, ingest_csv
+
+# Stages in order; 'failed' can replace any of them
+STAGES = ('queued', 'parsing', 'converting', 'profiling', 'ready')
+FINAL_STAGES = ('ready', 'failed')
+
+
+class DatasetDeleted(Exception):
+    """Raised inside the pipeline when its dataset is deleted mid-way"""
+
+
+def queue_upload(store, dataset_id, name):
+    """Record a new upload as queued; creates the dataset's store directory"""
+    status = {
+        'name': name,
+        'stage': 'queued',
+        'progress': 0.0,
+        'rows_parsed': 0,
+        'error': None,
+        'updated_at': datetime.now().isoformat()
+    }
+    store.set_status(dataset_id, status, create=True)
+    return status
+
+
+def submit_upload(manager, store, dataset_id, path, chunksize=100_000, remove_source=False):
+    """Run process_upload on a JobManager's pool, returning its Future"""
+    future = manager.call(process_upload, store.root, dataset_id, path, chunksize, remove_source)
+
+    def record_crash(f):
+        # A worker killed mid-way (e.g. out of memory) cannot report its own failure
+        if not f.cancelled() and f.exception() is None:
+            return
+        status = store.status(dataset_id)
+        if status is None or status['stage'] in FINAL_STAGES:
+            return
+        error = 'cancelled' if f.cancelled() else f.exception()
+        status.update(stage='failed', error=f'Upload processing stopped: {error}',
+                      updated_at=datetime.now().isoformat())
+        try:
+            store.set_status(dataset_id, status)
+        except OSError:
+            pass
+
+    future.add_done_callback(record_crash)
+    return future
+
+
+def process_upload(store_root, dataset_id, path, chunksize=100_000, remove_source=False):
+    """Worker entry point: parse, convert and profile one uploaded file
+
+    Progress goes to the store's status.json after every chunk or
+    column, so any server process can report it. The column profile
+    for version 1 is stored with the dataset, and the final status
+    carries what the backends need to finish registering it: headers,
+    row and column counts, inferred dtypes and numeric columns.
+    """
+    store = ColumnarStore(store_root)
+    status = store.status(dataset_id) or {}
+
+    def report(**changes):
+        status.update(changes, updated_at=datetime.now().isoformat())
+        if not os.path.isdir(store.path(dataset_id)):
+            raise DatasetDeleted(dataset_id)
+        store.set_status(dataset_id, status)
+
+    try:
+        report(stage='parsing', progress=0.0)
+        if path.endswith('.csv'):
+            size = os.path.getsize(path) or 1
+            with open(path, 'rb') as f:
+                meta, _ = ingest_csv(store, dataset_id, f, chunksize=chunksize,
+                                     on_chunk=lambda rows: report(progress=min(f.tell() / size, 1.0),
+                                                                  rows_parsed=rows))
+        else:
+            # Excel has no incremental reader; progress is per stage
+            report(progress=None)
+            df = pd.read_excel(path)
+            report(stage='converting', progress=None, rows_parsed=len(df))
+            meta = store.write(dataset_id, df)
+
+        report(stage='profiling', progress=0.0, rows_parsed=meta['row_count'])
+        profile = build_profile(store, dataset_id, 1,
+                                on_column=lambda done, total: report(progress=done / total))
+        store.set_profile(dataset_id, profile)
+        report(
+            stage='ready',
+            progress=1.0,
+            headers=[info['name'] for info in meta['columns']],
+            row_count=meta['row_count'],
+            column_count=len(meta['columns']),
+            dtypes={info['name']: info['dtype'] for info in meta['columns']},
+            numeric_columns=profile['numeric_columns']
+        )
+    except DatasetDeleted:
+        store.delete(dataset_id)
+    except Exception as e:
+        try:
+            report(stage='failed', error=str(e))
+        except (DatasetDeleted, OSError):
+            pass
+    finally:
+        if remove_source:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return status
+
+
+def parse_wait(value, maximum):
+    """Seconds to wait for a dataset to become ready, capped at maximum"""
+    if value in (None, ''):
+        return 0.0
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('wait must be a number of seconds')
+    if not seconds >= 0:
+        raise ValueError('wait must be a number of seconds')
+    return min(seconds, maximum)
+
+
+def wait_until(predicate, timeout, interval=0.25):
+    """Poll predicate() until it is true or timeout seconds pass"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+    return True
@@ -0,0 +1,183 @@
+# Column profiles for Quantitative Investment Platform
+# Per-column summaries computed once per dataset version and stored with it
+
+import numpy as np
+
+from incremental import RunningMoments
+from storage import ColumnarStore
+
+# Columns up to this many rows get exact quantiles; longer ones are sketched
+EXACT_QUANTILE_ROWS = 1_000_000
+
+# Rows of a long column summarized at a time
+PROFILE_BLOCK_ROWS = 1 << 20
+
+# Reported quantiles (names match the column-stats response)
+QUANTILES = {'q01': 0.01, 'q05': 0.05, 'q25': 0.25, 'median': 0.5, 'q75': 0.75, 'q95': 0.95, 'q99': 0.99}
+
+
+class QuantileSketch:
+    """Mergeable approximate quantiles from weighted sample points
+
+    Each block contributes its exact quantiles at `resolution + 1`
+    evenly spaced ranks, each point weighted by the share of the block
+    it stands for; when the summary grows past `buffer` blocks it is
+    compressed back to `resolution + 1` points the same way. Rank error
+    stays within a few multiples of 1 / resolution while memory is
+    O(resolution * buffer) whatever the column length.
+    """
+
+    def __init__(self, resolution=1000, buffer=16):
+        self.resolution = resolution
+        self.buffer = buffer
+        self.count = 0
+        self._values = []
+        self._weights = []
+        self._size = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        if n == 0:
+            return
+        if n <= self.resolution + 1:
+            points, weights = np.sort(values), np.ones(n)
+        else:
+            points = np.quantile(values, np.linspace(0.0, 1.0, self.resolution + 1))
+            weights = np.full(self.resolution + 1, n / (self.resolution + 1))
+        self._values.append(points)
+        self._weights.append(weights)
+        self._size += len(points)
+        self.count += n
+        if self._size > self.buffer * (self.resolution + 1):
+            self._compress()
+
+    def _merged(self):
+        values = np.concatenate(self._values)
+        weights = np.concatenate(self._weights)
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def _compress(self):
+        values, weights = self._merged()
+        points = self._at_ranks(values, weights, np.linspace(0.0, 1.0, self.resolution + 1))
+        self._values = [points]
+        self._weights = [np.full(len(points), weights.sum() / len(points))]
+        self._size = len(points)
+
+    @staticmethod
+    def _at_ranks(values, weights, qs):
+        # Each point sits at the middle of the rank interval it stands for
+        centers = np.cumsum(weights) - weights / 2
+        return np.interp(np.asarray(qs) * weights.sum(), centers, values)
+
+    def quantiles(self, qs):
+        """Approximate quantiles at the fractions qs (NaN if empty)"""
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        values, weights = self._merged()
+        return self._at_ranks(values, weights, qs)
+
+
+def _optional(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def profile_numeric(values):
+    """Summary of a numeric column; quantiles are sketched for long columns"""
+    total = len(values)
+    stats = {'type': 'numeric', 'dtype': str(values.dtype)}
+    if total <= EXACT_QUANTILE_ROWS:
+        data = np.asarray(values, dtype=float)
+        data = data[~np.isnan(data)]
+        count = len(data)
+        quantiles = np.quantile(data, list(QUANTILES.values())) if count else [np.nan] * len(QUANTILES)
+        stats.update(
+            count=count,
+            missing=total - count,
+            mean=_optional(data.mean()) if count else None,
+            std=_optional(data.std(ddof=1)) if count > 1 else None,
+            min=_optional(data.min()) if count else None,
+            max=_optional(data.max()) if count else None,
+            approximate=False
+        )
+    else:
+        moments = RunningMoments([])
+        sketch = QuantileSketch()
+        low, high = np.inf, -np.inf
+        for start in range(0, total, PROFILE_BLOCK_ROWS):
+            block = np.asarray(values[start:start + PROFILE_BLOCK_ROWS], dtype=float)
+            block = block[~np.isnan(block)]
+            if len(block):
+                moments.update(block)
+                sketch.update(block)
+                low = min(low, float(block.min()))
+                high = max(high, float(block.max()))
+        count = moments.count
+        quantiles = sketch.quantiles(list(QUANTILES.values()))
+        stats.update(
+            count=count,
+            missing=total - count,
+            mean=_optional(moments.mean) if count else None,
+            std=_optional(np.sqrt(moments.m2 / (count - 1))) if count > 1 else None,
+            min=low if count else None,
+            max=high if count else None,
+            approximate=True
+        )
+    for name, value in zip(QUANTILES, quantiles):
+        stats[name] = _optional(value)
+    return stats
+
+
+def profile_categorical(series):
+    """Summary of a non-numeric column from one value_counts pass"""
+    counts = series.value_counts()
+    count = int(counts.sum())
+    return {
+        'type': 'categorical',
+        'dtype': str(series.dtype),
+        'count': count,
+        'missing': len(series) - count,
+        'unique': len(counts),
+        'top': str(counts.index[0]) if len(counts) else None,
+        'freq': int(counts.iloc[0]) if len(counts) else 0
+    }
+
+
+def build_profile(store, dataset_id, version, on_column=None):
+    """Profile every column of a stored dataset, reading one column at a time"""
+    meta = store.meta(dataset_id)
+    columns = {}
+    for i, info in enumerate(meta['columns']):
+        series = store.read_column(dataset_id, info['name'])
+        kind = np.dtype(info['dtype']).kind if info['file'] is not None else 'O'
+        if kind in 'iuf':
+            columns[info['name']] = profile_numeric(series.to_numpy())
+        else:
+            columns[info['name']] = profile_categorical(series)
+        if on_column is not None:
+            on_column(i + 1, len(meta['columns']))
+    return {
+        'version': version,
+        'row_count': meta['row_count'],
+        'columns': columns,
+        'numeric_columns': [name for name, stats in columns.items() if stats['type'] == 'numeric']
+    }
+
+
+def load_profile(store, dataset_id, version):
+    """The stored profile for this dataset version, built and stored if missing or stale"""
+    profile = store.profile(dataset_id)
+    if profile is None or profile['version'] != version:
+        profile = build_profile(store, dataset_id, version)
+        store.set_profile(dataset_id, profile)
+    return profile
+
+
+def refresh_profile(store_root, dataset_id, version):
+    """Worker entry point: rebuild the profile after the data changed"""
+    store = ColumnarStore(store_root)
+    current = store.profile(dataset_id)
+    if current is None or current['version'] < version:
+        store.set_profile(dataset_id, build_profile(store, dataset_id, version))
@@ -0,0 +1,185 @@
+# Response serialization for Quantitative Investment Platform
+# Shared by flask_backend.py and django_backend.py
+
+import io
+import json
+import math
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow responses are optional
+    pa = None
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are optional
+    msgpack = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Rows serialized per chunk when streaming
+STREAM_BLOCK_ROWS = 10_000
+
+
+def nan_to_none(values):
+    """Array to nested lists with NaN/inf replaced by None (valid JSON)"""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def encode_default(obj):
+    """Fallback for values the encoders do not handle natively"""
+    if isinstance(obj, np.ndarray):  # object/string arrays; numeric ones are native
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.to_numpy()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _json_safe(obj):
+    """Replace NaN/inf with None and arrays with lists (stdlib encoder path)"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _json_safe(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_safe(value) for value in obj]
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in 'fc':
+        return nan_to_none(obj)
+    if isinstance(obj, (np.ndarray, np.generic, pd.Series, pd.Index)):
+        return _json_safe(encode_default(obj))
+    return obj
+
+
+def dumps_json(obj, default=encode_default):
+    """Encode a response body as compact JSON bytes
+
+    Uses orjson when installed, which writes NumPy arrays and scalars
+    directly instead of going through Python lists. NaN and infinities
+    become null either way, so the output is always valid JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_json_safe(obj), default=default, allow_nan=False,
+                      separators=(',', ':')).encode()
+
+
+def dumps_msgpack(obj, single_float=False, default=encode_default):
+    """Encode a response body as MessagePack
+
+    NaN survives as an IEEE float. single_float packs every float in 4
+    bytes instead of 8, for long time series where float32 precision is
+    enough.
+    """
+    if msgpack is None:
+        raise RuntimeError('msgpack is not installed')
+    return msgpack.packb(obj, default=default, use_single_float=single_float)
+
+
+def parse_limit(value):
+    """Optional non-negative row count; None (absent or empty) means no limit
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('limit must be an integer')
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 0:
+        raise ValueError('limit must be non-negative')
+    return limit
+
+
+def parse_row_window(args, headers):
+    """Read offset, limit and columns query parameters
+
+    Returns (offset, limit, columns); limit is None for "to the end".
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        offset = int(args.get('offset', 0))
+        limit = args.get('limit')
+        limit = int(limit) if limit not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('offset and limit must be integers')
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError('offset and limit must be non-negative')
+
+    columns = args.get('columns')
+    if columns:
+        columns = [col for col in columns.split(',') if col]
+        for col in columns:
+            if col not in headers:
+                raise ValueError(f'Column {col} not found')
+    else:
+        columns = list(headers)
+    return offset, limit, columns
+
+
+def response_format(args, accept=''):
+    """Pick json, ndjson, arrow or msgpack from ?format= or the Accept header"""
+    fmt = args.get('format')
+    if fmt:
+        return fmt
+    if ARROW_MIMETYPE in accept:
+        return 'arrow'
+    if MSGPACK_MIMETYPE in accept:
+        return 'msgpack'
+    if NDJSON_MIMETYPE in accept:
+        return 'ndjson'
+    return 'json'
+
+
+def iter_ndjson(df, block_rows=STREAM_BLOCK_ROWS):
+    """Yield the frame as newline-delimited JSON records, one block at a time"""
+    for start in range(0, len(df), block_rows):
+        block = df.iloc[start:start + block_rows]
+        text = block.to_json(orient='records', lines=True, date_format='iso', double_precision=15)
+        yield text if text.endswith('\n') else text + '\n'
+
+
+def iter_arrow_ipc(df, block_rows=STREAM_BLOCK_ROWS):
+    """Yield the frame as an Arrow IPC stream, one record batch per block"""
+    if pa is None:
+        raise RuntimeError('pyarrow is not installed')
+    sink = io.BytesIO()
+    writer = None
+    for start in range(0, len(df), block_rows):
+        batch = pa.RecordBatch.from_pandas(df.iloc[start:start + block_rows], preserve_index=False)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield _drain(sink)
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, pa.Schema.from_pandas(df, preserve_index=False))
+    writer.close()
+    yield _drain(sink)
+
+
+def _drain(sink):
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -0,0 +1,480 @@
+# Dataset storage for Quantitative Investment Platform
+# Shared by flask_backend.py and django_backend.py
+
+import os
+import json
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Non-POSIX: locks only cover threads of one process
+    fcntl = None
+
+
+class ColumnarStore:
+    """Per-column binary files written at upload and memory-mapped on read
+
+    Numeric, boolean and datetime columns are saved as individual raw
+    arrays (dtype recorded in meta.json) so a reader can map a single
+    column without touching the rest of the dataset, and a writer can
+    append to them chunk by chunk. Remaining (object/string) columns are
+    kept together in pickled parts since they cannot be memory-mapped
+    anyway.
+    """
+
+    META_FILE = 'meta.json'
+    STATUS_FILE = 'status.json'
+    PROFILE_FILE = 'profile.json'
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, dataset_id):
+        return os.path.join(self.root, str(dataset_id))
+
+    def exists(self, dataset_id):
+        return os.path.exists(os.path.join(self.path(dataset_id), self.META_FILE))
+
+    def write(self, dataset_id, df):
+        """Convert a parsed DataFrame into the columnar layout"""
+        writer = self.writer(dataset_id, downcast=False)
+        writer.append(df)
+        return writer.close()
+
+    def writer(self, dataset_id, downcast=True):
+        """Incremental writer; see ColumnarWriter"""
+        return ColumnarWriter(self, dataset_id, downcast)
+
+    def appender(self, dataset_id, downcast=True):
+        """Writer that appends rows to an existing dataset in place"""
+        return ColumnarWriter(self, dataset_id, downcast, resume=True)
+
+    def meta(self, dataset_id):
+        with open(os.path.join(self.path(dataset_id), self.META_FILE)) as f:
+            return json.load(f)
+
+    def read_column(self, dataset_id, column):
+        """Return one column as a Series backed by a read-only memory map"""
+        meta = self.meta(dataset_id)
+        for info in meta['columns']:
+            if info['name'] == column:
+                break
+        else:
+            raise KeyError(column)
+
+        if info['file'] is None:
+            return self._read_other(dataset_id, meta)[column]
+        return pd.Series(self._map(dataset_id, info, meta['row_count']), name=column, copy=False)
+
+    def read(self, dataset_id, columns=None):
+        """Return the requested columns (default all) as a DataFrame"""
+        meta = self.meta(dataset_id)
+        wanted = [info for info in meta['columns'] if columns is None or info['name'] in columns]
+        other = None
+        data = {}
+        for info in wanted:
+            if info['file'] is None:
+                if other is None:
+                    other = self._read_other(dataset_id, meta)
+                data[info['name']] = other[info['name']]
+            else:
+                values = self._map(dataset_id, info, meta['row_count'])
+                data[info['name']] = pd.Series(values, name=info['name'], copy=False)
+        return pd.DataFrame(data, copy=False)
+
+    def status(self, dataset_id):
+        """Upload pipeline progress recorded by set_status, or None"""
+        return self._read_json(dataset_id, self.STATUS_FILE)
+
+    def set_status(self, dataset_id, status, create=False):
+        """Atomically replace the upload status; only create=True makes the directory"""
+        if create:
+            os.makedirs(self.path(dataset_id), exist_ok=True)
+        self._write_json(dataset_id, self.STATUS_FILE, status)
+
+    def profile(self, dataset_id):
+        """Stored column profile (see profiling.build_profile), or None"""
+        return self._read_json(dataset_id, self.PROFILE_FILE)
+
+    def set_profile(self, dataset_id, profile):
+        self._write_json(dataset_id, self.PROFILE_FILE, profile)
+
+    def delete(self, dataset_id):
+        shutil.rmtree(self.path(dataset_id), ignore_errors=True)
+        # A background writer may still be filling its staging directory
+        shutil.rmtree(self.path(dataset_id) + '.tmp', ignore_errors=True)
+
+    def _read_json(self, dataset_id, name):
+        try:
+            with open(os.path.join(self.path(dataset_id), name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_json(self, dataset_id, name, data):
+        path = os.path.join(self.path(dataset_id), name)
+        # Unique temporary name: several processes may write the same file
+        tmp = f'{path}.{uuid.uuid4().hex}.new'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, path)
+
+    def _map(self, dataset_id, info, row_count):
+        dtype = np.dtype(info['dtype'])
+        if row_count == 0:
+            return np.empty(0, dtype=dtype)
+        path = os.path.join(self.path(dataset_id), info['file'])
+        return np.memmap(path, dtype=dtype, mode='r', shape=(row_count,))
+
+    def _read_other(self, dataset_id, meta):
+        parts = [pd.read_pickle(os.path.join(self.path(dataset_id), name)) for name in meta['other_parts']]
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, ignore_index=True)
+
+
+class DatasetRegistry:
+    """Dataset index shared by every worker process through the store
+
+    Each dataset's descriptive fields (name, headers, row_count,
+    column_count, uploaded_at, version) live in an info.json next to its
+    meta.json, so any process that can see the store directory sees the
+    same datasets, while column data is mapped from the shared files.
+    Behaves like a dict of dataset id -> info; changes go through
+    __setitem__, update() and __delitem__ so they reach the other
+    workers. Parsed entries are cached per process and re-read when the
+    file changes.
+    """
+
+    INFO_FILE = 'info.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, store):
+        self.store = store
+        self._cache = {}
+        self._thread_lock = threading.Lock()
+
+    def _info_path(self, dataset_id):
+        return os.path.join(self.store.path(dataset_id), self.INFO_FILE)
+
+    def __contains__(self, dataset_id):
+        return os.path.exists(self._info_path(dataset_id))
+
+    def __getitem__(self, dataset_id):
+        path = self._info_path(dataset_id)
+        try:
+            stat = os.stat(path)
+            # Writers replace the file, so a new inode means new contents
+            version = (stat.st_ino, stat.st_mtime_ns)
+            cached = self._cache.get(dataset_id)
+            if cached is None or cached[0] != version:
+                with open(path) as f:
+                    cached = (version, json.load(f))
+                self._cache[dataset_id] = cached
+        except FileNotFoundError:
+            self._cache.pop(dataset_id, None)
+            raise KeyError(dataset_id)
+        # Callers get a copy; mutate through update()
+        return dict(cached[1])
+
+    def get(self, dataset_id, default=None):
+        try:
+            return self[dataset_id]
+        except KeyError:
+            return default
+
+    def __setitem__(self, dataset_id, info):
+        path = self._info_path(dataset_id)
+        # Unique temporary name: several processes may write the same file
+        tmp = f'{path}.{uuid.uuid4().hex}.new'
+        with open(tmp, 'w') as f:
+            json.dump(info, f, default=str)
+        os.replace(tmp, path)
+
+    def __delitem__(self, dataset_id):
+        if dataset_id not in self:
+            raise KeyError(dataset_id)
+        os.remove(self._info_path(dataset_id))
+        self._cache.pop(dataset_id, None)
+        self.store.delete(dataset_id)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        """Dataset ids in upload order"""
+        return [dataset_id for dataset_id, _ in self.items()]
+
+    def items(self):
+        entries = []
+        for name in os.listdir(self.store.root):
+            info = self.get(name)
+            if info is not None:
+                entries.append((name, info))
+        return sorted(entries, key=lambda entry: entry[1].get('uploaded_at', ''))
+
+    def update(self, dataset_id, **changes):
+        """Apply changes to a dataset's info; hold lock() around read-modify-write"""
+        info = self[dataset_id]
+        info.update(changes)
+        self[dataset_id] = info
+        return info
+
+    @contextmanager
+    def lock(self, dataset_id, shared=False):
+        """Cross-process lock on one dataset (exclusive unless shared=True)"""
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+        with open(os.path.join(self.store.path(dataset_id), self.LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ColumnarWriter:
+    """Append DataFrame chunks to a dataset in the columnar layout
+
+    The first chunk decides which columns are stored as binary arrays
+    (numeric, boolean, datetime) and which as objects. Values a later
+    chunk brings to an array column are converted, never coerced: if
+    some would not survive the conversion (text in a column that looked
+    numeric or was empty so far), the column moves to object storage
+    with the rows already written. With downcast=True each
+    numeric column uses the narrowest dtype that represents the data
+    exactly, widening the file already written if a later chunk needs
+    more range or precision. Memory use is bounded by the chunk size.
+
+    With resume=True rows are appended to an existing dataset in place:
+    column files only grow past the published row_count and widened
+    columns go to new files, so readers holding the previous meta.json
+    keep a consistent view until the new metadata replaces it. Column
+    types never change on append, so such values raise ValueError.
+    """
+
+    def __init__(self, store, dataset_id, downcast=True, resume=False):
+        self.store = store
+        self.dataset_id = dataset_id
+        self.downcast = downcast
+        self.resume = resume
+        self.target = store.path(dataset_id)
+        self._created = []
+        self._obsolete = []
+        if resume:
+            meta = store.meta(dataset_id)
+            self.tmp = self.target
+            self.columns = meta['columns']
+            self.other_parts = meta['other_parts']
+            self.row_count = meta['row_count']
+            # Drop bytes left behind by an append that never published
+            for info in self.columns:
+                if info['file'] is not None:
+                    with open(os.path.join(self.tmp, info['file']), 'ab') as f:
+                        f.truncate(self.row_count * np.dtype(info['dtype']).itemsize)
+        else:
+            self.tmp = self.target + '.tmp'
+            self.columns = None
+            self.other_parts = []
+            self.row_count = 0
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            os.makedirs(self.tmp)
+
+    def append(self, chunk):
+        if self.columns is None:
+            self._init_schema(chunk)
+
+        other = {}
+        for i, info in enumerate(self.columns):
+            series = chunk.iloc[:, i]
+            if info['file'] is None:
+                other[info['name']] = series.astype(object)
+                continue
+            if not is_mappable(series):
+                if np.dtype(info['dtype']).kind == 'M':
+                    converted = pd.to_datetime(series, errors='coerce')
+                else:
+                    converted = pd.to_numeric(series, errors='coerce')
+                if (converted.isna() & series.notna()).any():
+                    self._to_object(info, len(chunk))
+                    other[info['name']] = series.astype(object)
+                    continue
+                series = converted
+            values = series.to_numpy()
+            dtype = narrowest_dtype(values) if self.downcast else values.dtype
+            dtype = np.result_type(np.dtype(info['dtype']), dtype)
+            if dtype != np.dtype(info['dtype']):
+                self._widen(info, dtype)
+            with open(os.path.join(self.tmp, info['file']), 'ab') as f:
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+        if other:
+            name = f'other_{len(self.other_parts)}.pkl'
+            pd.DataFrame(other).to_pickle(os.path.join(self.tmp, name))
+            self.other_parts.append(name)
+            self._created.append(name)
+
+        self.row_count += len(chunk)
+
+    def close(self):
+        """Write metadata and atomically publish the dataset"""
+        meta = {
+            'columns': self.columns or [],
+            'other_parts': self.other_parts,
+            'row_count': self.row_count
+        }
+        meta_path = os.path.join(self.tmp, ColumnarStore.META_FILE)
+        with open(meta_path + '.new', 'w') as f:
+            json.dump(meta, f, default=str)
+        os.replace(meta_path + '.new', meta_path)
+
+        if self.resume:
+            for name in self._obsolete:
+                os.remove(os.path.join(self.tmp, name))
+        else:
+            # Readers look for meta.json, which moves last, so they never see a
+            # partial write; files already in the target (registry info, upload
+            # status, lock) are kept
+            os.makedirs(self.target, exist_ok=True)
+            for name in os.listdir(self.tmp):
+                if name != ColumnarStore.META_FILE:
+                    os.replace(os.path.join(self.tmp, name), os.path.join(self.target, name))
+            os.replace(meta_path, os.path.join(self.target, ColumnarStore.META_FILE))
+            os.rmdir(self.tmp)
+        return meta
+
+    def abort(self):
+        if self.resume:
+            for name in self._created:
+                os.remove(os.path.join(self.tmp, name))
+        else:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _init_schema(self, chunk):
+        self.columns = []
+        for i, name in enumerate(chunk.columns):
+            series = chunk.iloc[:, i]
+            if is_mappable(series):
+                values = series.to_numpy()
+                dtype = narrowest_dtype(values) if self.downcast else values.dtype
+                self.columns.append({'name': name, 'dtype': dtype.str, 'file': f'c{i}.bin'})
+                open(os.path.join(self.tmp, f'c{i}.bin'), 'wb').close()
+            else:
+                self.columns.append({'name': name, 'dtype': 'object', 'file': None})
+
+    def _to_object(self, info, block):
+        """Move an array column, with the rows written so far, to object storage
+
+        Existing object parts gain the column one part at a time; without
+        any, parts of `block` rows are written for the earlier rows.
+        """
+        if self.resume:
+            raise ValueError(f"Column {info['name']} is {np.dtype(info['dtype']).name}; "
+                             f"appended values must be the same type")
+        path = os.path.join(self.tmp, info['file'])
+        dtype = np.dtype(info['dtype'])
+        written = np.memmap(path, dtype=dtype, mode='r', shape=(self.row_count,)) if self.row_count else np.empty(0, dtype)
+        if self.other_parts:
+            offset = 0
+            for name in self.other_parts:
+                part_path = os.path.join(self.tmp, name)
+                part = pd.read_pickle(part_path)
+                part[info['name']] = pd.Series(written[offset:offset + len(part)]).astype(object).to_numpy()
+                part.to_pickle(part_path)
+                offset += len(part)
+        else:
+            for start in range(0, self.row_count, max(block, 1)):
+                name = f'other_{len(self.other_parts)}.pkl'
+                values = pd.Series(written[start:start + block]).astype(object)
+                pd.DataFrame({info['name']: values}).to_pickle(os.path.join(self.tmp, name))
+                self.other_parts.append(name)
+                self._created.append(name)
+        del written
+        os.remove(path)
+        info['dtype'] = 'object'
+        info['file'] = None
+
+    def _widen(self, info, dtype, block=1 << 20):
+        """Rewrite a column file with a wider dtype, one block at a time"""
+        path = os.path.join(self.tmp, info['file'])
+        old_dtype = np.dtype(info['dtype'])
+        # Published files are left untouched; the new one is swapped in by close()
+        name = info['file'].split('.')[0] + f'.{np.dtype(dtype).name}.bin' if self.resume else info['file']
+        new_path = os.path.join(self.tmp, name)
+        with open(new_path + '.widen', 'wb') as f:
+            if self.row_count:
+                old = np.memmap(path, dtype=old_dtype, mode='r', shape=(self.row_count,))
+                for start in range(0, self.row_count, block):
+                    f.write(np.asarray(old[start:start + block], dtype=dtype).tobytes())
+                del old
+        os.replace(new_path + '.widen', new_path)
+        if name != info['file']:
+            if info['file'] in self._created:
+                os.remove(path)
+                self._created.remove(info['file'])
+            else:
+                self._obsolete.append(info['file'])
+            self._created.append(name)
+            info['file'] = name
+        info['dtype'] = np.dtype(dtype).str
+
+
+def is_mappable(series):
+    """Whether a column can be stored as a plain binary array"""
+    dtype = series.dtype
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+
+
+def narrowest_dtype(values):
+    """Smallest integer dtype holding the values, or float32 if lossless"""
+    kind = values.dtype.kind
+    if kind in 'iu' and len(values):
+        return np.result_type(np.min_scalar_type(values.min()), np.min_scalar_type(values.max()))
+    if kind == 'f' and values.dtype.itemsize > 4:
+        with np.errstate(over='ignore', invalid='ignore'):
+            narrow = values.astype(np.float32)
+        if np.array_equal(narrow, values, equal_nan=True):
+            return np.dtype(np.float32)
+    return values.dtype
+
+
+def numeric_columns(meta):
+    """Names of the numeric columns recorded in store metadata"""
+    return [info['name'] for info in meta['columns']
+            if info['file'] is not None and np.dtype(info['dtype']).kind in 'iufc']
+
+
+def ingest_csv(store, dataset_id, source, chunksize=100_000, preview_rows=50, on_chunk=None):
+    """Parse a CSV stream chunk by chunk straight into the columnar store
+
+    Returns the store metadata and the first rows for previews. Only one
+    chunk is held in memory at a time. on_chunk(rows_written) is called
+    after each chunk, e.g. to report progress.
+    """
+    writer = store.writer(dataset_id)
+    preview = None
+    try:
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            if preview is None:
+                preview = chunk.head(preview_rows)
+            writer.append(chunk)
+            if on_chunk is not None:
+                on_chunk(writer.row_count)
+        if preview is None:
+            raise ValueError('No rows found in CSV')
+        return writer.close(), preview
+    except Exception:
+        writer.abort()
+        raise
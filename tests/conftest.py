@@ -0,0 +1,7 @@
+# Test configuration for Quantitative Investment Platform
+# Makes the top-level modules importable however pytest is invoked
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+# Backtesting tests for Quantitative Investment Platform
+# The sweep and vectorized engines against reference implementations
+
+import numpy as np
+import pytest
+
+from analytics import calculate_moving_average
+from backtesting import (generate_signals, simulate_equity, position_changes, run_backtest,
+                         sweep_backtests, sma_references, INITIAL_CAPITAL)
+
+
+def loop_backtest(prices, strategy_type, parameter, initial_capital=INITIAL_CAPITAL):
+    """The per-bar loop the vectorized engine replaced: (signals, positions, equity)
+
+    The moving average is taken from running sums, the definition the
+    engine shares with the sweep (test_sma_references_match_convolution
+    covers its precision).
+    """
+    signals = np.zeros(len(prices))
+    if strategy_type == 'buyhold':
+        signals = np.ones(len(prices))
+    elif strategy_type == 'sma':
+        running = [0.0]
+        for price in prices:
+            running.append(running[-1] + price)
+        for i in range(parameter, len(prices)):
+            sma = (running[i] - running[i - parameter]) / parameter
+            signals[i] = 1 if prices[i] > sma else 0
+    elif strategy_type == 'momentum':
+        for i in range(parameter, len(prices)):
+            signals[i] = 1 if prices[i] > prices[i - parameter] else 0
+
+    cash = initial_capital
+    position = 0.0
+    positions, values = [], []
+    for i in range(len(prices)):
+        if signals[i] == 1 and position == 0:
+            position = cash / prices[i]
+            cash = 0
+        elif signals[i] == 0 and position > 0:
+            cash = position * prices[i]
+            position = 0
+        positions.append(position)
+        values.append(cash + position * prices[i])
+    return signals, np.array(positions), np.array(values)
+
+
+def tie_heavy_prices(decimals, n=332, seed=7):
+    """A random walk rounded so prices, and their moving averages, often tie"""
+    rng = np.random.default_rng(seed)
+    prices = 100 + np.cumsum(rng.normal(0, 1, n))
+    return prices if decimals is None else np.round(prices, decimals)
+
+
+@pytest.mark.parametrize('decimals', [None, 0, 1])
+@pytest.mark.parametrize('strategy_type', ['buyhold', 'sma', 'momentum', 'unknown'])
+def test_vectorized_engine_matches_loop(strategy_type, decimals):
+    prices = tie_heavy_prices(decimals, n=120)
+    for parameter in (1, 2, 20, len(prices) - 1, len(prices), len(prices) + 10):
+        signals, positions, values = loop_backtest(prices, strategy_type, parameter)
+        vectorized = generate_signals(prices, strategy_type, parameter)
+
+        np.testing.assert_array_equal(vectorized, signals)
+        np.testing.assert_array_equal(vectorized == 1, positions > 0)
+        trades = np.diff((positions > 0).astype(float), prepend=0.0)
+        np.testing.assert_array_equal(position_changes(vectorized), trades)
+        np.testing.assert_allclose(simulate_equity(prices, vectorized), values, rtol=1e-12)
+        np.testing.assert_allclose(run_backtest(prices, strategy_type, parameter), values, rtol=1e-12)
+
+
+def test_sma_references_match_convolution():
+    prices = tie_heavy_prices(None, n=5000)
+    windows = [1, 2, 20, 200, 4999]
+    references = sma_references(prices, windows)
+    for row, window in zip(references, windows):
+        assert np.isnan(row[:window]).all()
+        expected = calculate_moving_average(prices, window)[:len(prices) - window]
+        # Running sums lose about n * eps of the price level, not of the window
+        np.testing.assert_allclose(row[window:], expected, rtol=1e-12, atol=1e-10)
+
+
+@pytest.mark.parametrize('decimals', [0, 1])
+@pytest.mark.parametrize('strategy_type', ['sma', 'momentum', 'buyhold'])
+def test_sweep_matches_run_backtest(strategy_type, decimals):
+    prices = tie_heavy_prices(decimals)
+    windows = list(range(1, len(prices) + 5))
+    metrics = sweep_backtests(prices, strategy_type, windows)
+
+    for i, window in enumerate(windows):
+        equity = run_backtest(prices, strategy_type, window)
+        assert metrics['final_value'][i] == equity[-1], f'{strategy_type} window {window}'
+        drawdown = ((np.maximum.accumulate(equity) - equity) / np.maximum.accumulate(equity)).max()
+        assert metrics['max_drawdown'][i] == pytest.approx(drawdown, rel=1e-12, abs=1e-15)
+
+
+def test_sweep_blocks_match_single_pass():
+    prices = tie_heavy_prices(1)
+    windows = list(range(2, 120, 3))
+    whole = sweep_backtests(prices, 'sma', windows)
+    blocked = sweep_backtests(prices, 'sma', windows, max_cells=len(prices) * 3)
+    for name, values in whole.items():
+        np.testing.assert_array_equal(values, blocked[name])
@@ -0,0 +1,49 @@
+# Incremental analytics tests for Quantitative Investment Platform
+# Accumulators folded forward over appends against a full recompute
+
+import numpy as np
+import pytest
+
+from analytics import compute_risk_metrics
+from caching import LRUCache
+from incremental import RiskAccumulator, SortedSample
+
+
+def price_walk(n, seed=3):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+@pytest.mark.parametrize('batch', [1, 7, 500])
+def test_sorted_sample_percentiles(batch):
+    rng = np.random.default_rng(batch)
+    values = rng.normal(size=3000)
+    # Rounded values tie across the main array and the tail
+    values[::3] = np.round(values[::3], 1)
+    sample = SortedSample(values[:100])
+    for start in range(100, len(values), batch):
+        sample.add(values[start:start + batch])
+        seen = values[:start + batch]
+        for q in (0, 1, 5, 50, 100):
+            assert sample.percentile(q) == pytest.approx(np.percentile(seen, q), rel=1e-12, abs=1e-15)
+    assert len(sample) == len(values)
+
+
+def test_risk_accumulator_matches_recompute():
+    prices = price_walk(20_000)
+    accumulator = RiskAccumulator(prices[:5000])
+    for start in range(5000, len(prices), 1000):
+        accumulator.update(prices[start:start + 1000])
+
+    result, expected = accumulator.result(), compute_risk_metrics(prices)
+    for name, value in expected.items():
+        assert result[name] == pytest.approx(value, rel=1e-9), name
+
+
+def test_accumulators_are_budgeted_by_size():
+    small, large = RiskAccumulator(price_walk(1001)), RiskAccumulator(price_walk(10_001))
+    cache = LRUCache(10_000 * 8, sizeof=lambda entry: entry.nbytes)
+    cache.put('small', small)
+    cache.put('large', large)
+    assert 'small' not in cache and 'large' in cache
+    assert cache.current_bytes == large.nbytes == 10_000 * 8
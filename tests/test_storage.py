@@ -0,0 +1,60 @@
+# Storage tests for Quantitative Investment Platform
+# Chunked ingestion into the columnar store when column types change between chunks
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage import ColumnarStore, ingest_csv
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ColumnarStore(str(tmp_path))
+
+
+def test_text_after_numeric_chunk_is_kept(store):
+    # First chunk: ticker is empty and code is numeric; the second brings text
+    rows = ['price,ticker,code', '1.5,,1', '2.5,,2', '3.5,AAPL,A1', '4.5,MSFT,3']
+    meta, _ = ingest_csv(store, 'mixed', io.StringIO('\n'.join(rows)), chunksize=2)
+
+    types = {info['name']: info['dtype'] for info in meta['columns']}
+    assert types['ticker'] == 'object' and types['code'] == 'object'
+    assert np.dtype(types['price']).kind == 'f'
+
+    frame = store.read('mixed')
+    assert frame['price'].tolist() == [1.5, 2.5, 3.5, 4.5]
+    assert frame['ticker'].tolist()[2:] == ['AAPL', 'MSFT']
+    assert frame['ticker'].isna().tolist()[:2] == [True, True]
+    assert [str(value) for value in frame['code']] == ['1', '2', 'A1', '3']
+
+
+def test_text_after_object_chunks_is_kept(store):
+    # An object column already has parts that the demoted column joins
+    rows = ['name,value', 'a,1', 'b,2', 'c,3', 'd,x', 'e,5']
+    ingest_csv(store, 'parts', io.StringIO('\n'.join(rows)), chunksize=2)
+
+    frame = store.read('parts')
+    assert frame['name'].tolist() == ['a', 'b', 'c', 'd', 'e']
+    assert [str(value) for value in frame['value']] == ['1', '2', '3', 'x', '5']
+
+
+def test_numeric_chunks_stay_mapped(store):
+    rows = ['value', '1', '2', 'NaN', '4.5']
+    meta, _ = ingest_csv(store, 'numeric', io.StringIO('\n'.join(rows)), chunksize=2)
+
+    assert meta['columns'][0]['file'] is not None
+    values = store.read_column('numeric', 'value')
+    assert np.isnan(values[2]) and values[3] == 4.5
+
+
+def test_append_rejects_text_in_numeric_column(store):
+    ingest_csv(store, 'append', io.StringIO('value\n1\n2\n'))
+
+    writer = store.appender('append')
+    with pytest.raises(ValueError, match='value'):
+        writer.append(pd.DataFrame({'value': ['x']}))
+    writer.abort()
+    assert store.read_column('append', 'value').tolist() == [1, 2]